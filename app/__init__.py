@@ -1,24 +1,75 @@
+import logging
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from config import Config
+from app.models import db, Location, upgrade_schema, backfill_geohashes, backfill_latest, backfill_rollups
+from app.utils import log, metrics, timing, upstream, weather_api, elevation_store, dem, osm_context, storage, spatial
 
-db = SQLAlchemy()
+logger = logging.getLogger(__name__)
 
-def create_app(config_class=Config):
+def init_db(app):
+    """Create and upgrade the schema, backfill derived columns and seed a test location"""
+    with app.app_context():
+        try:
+            db.create_all()
+            upgrade_schema()
+            backfill_geohashes()
+            backfill_latest()
+            backfill_rollups()
+            logger.info("Database tables created successfully")
+            
+            # Check if we have any locations
+            if Location.query.count() == 0:
+                logger.info("No locations found, creating test location")
+                test_location = Location(
+                    name="Test Location",
+                    description="A test location for development",
+                    latitude=51.5074,
+                    longitude=-0.1278,
+                    elevation=35.0
+                )
+                db.session.add(test_location)
+                db.session.commit()
+                logger.info("Test location created successfully")
+        except Exception:
+            logger.exception("Error initializing database; please check your database configuration")
+
+def create_app(config_class=Config, start_workers=True):
+    """
+    Application factory. The storage backend follows
+    SQLALCHEMY_DATABASE_URI (DATABASE_URL): SQLite connections get tuning
+    pragmas, other backends a pooled engine (DB_POOL_* settings), and the
+    spatial index strategy is picked to match (see app.utils.spatial).
+    ``start_workers`` controls the in-process refresh and retention threads.
+    """
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", storage.engine_options(app.config))
+
+    # Structured, queued logging with request ids (first, so setup is logged too)
+    log.init_app(app)
     
     # Initialize extensions
     db.init_app(app)
+    storage.init_app(app, db)
+    metrics.init_app(app, db)
+    timing.init_app(app, db)
     CORS(app)
+
+    # Upstream HTTP client, shared forecast cache and persistent elevation/OSM stores
+    upstream.init_app(app)
+    weather_api.init_app(app)
+    elevation_store.init_app(app)
+    dem.init_app(app)
+    osm_context.init_app(app)
+
+    # Create database tables, then the spatial index that builds on them
+    init_db(app)
+    spatial.init_app(app)
     
     # Register blueprints
     from app.routes import main
+    main.init_app(app, start_workers=start_workers)
     app.register_blueprint(main.bp)
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
-    
-    return app 
\ No newline at end of file
+    return app
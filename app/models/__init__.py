@@ -0,0 +1,380 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime, timedelta
+from sqlalchemy.dialects import postgresql, sqlite
+from app.utils.geo import geohash_encode
+
+db = SQLAlchemy()
+
+def upgrade_schema():
+    """
+    Add columns that were introduced after a table was first created.
+    db.create_all() only creates missing tables, so existing databases
+    would otherwise never see new (nullable) columns.
+    """
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                db.session.execute(db.text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        db.session.commit()
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=db.engine)
+
+def backfill_latest():
+    """Fill in the denormalized latest weather/risk columns for older rows"""
+    db.session.execute(db.text(
+        "UPDATE locations SET latest_weather_id = ("
+        "SELECT w.id FROM weather_data w WHERE w.location_id = locations.id "
+        "ORDER BY w.timestamp DESC, w.id DESC LIMIT 1) "
+        "WHERE latest_weather_id IS NULL"
+    ))
+    db.session.execute(db.text(
+        "UPDATE locations SET latest_risk_level = r.risk_level, latest_risk_at = r.timestamp "
+        "FROM (SELECT location_id, risk_level, timestamp, ROW_NUMBER() OVER ("
+        "PARTITION BY location_id ORDER BY timestamp DESC, id DESC) AS rank FROM risk_assessments) r "
+        "WHERE r.location_id = locations.id AND r.rank = 1 AND locations.latest_risk_at IS NULL"
+    ))
+    db.session.commit()
+
+def backfill_geohashes():
+    """Fill in Location.geohash for rows created before the column existed"""
+    for location in Location.query.filter(Location.geohash.is_(None)).all():
+        location.geohash = geohash_encode(location.latitude, location.longitude)
+    db.session.commit()
+
+class Location(db.Model):
+    __tablename__ = 'locations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    description = db.Column(db.Text)
+    elevation = db.Column(db.Float)  # metres; NULL until resolved
+    rainfall_history = db.Column(db.JSON, default=list)
+    average_rainfall = db.Column(db.Float, default=0)
+    geohash = db.Column(db.String(12), index=True)  # spatial index key, kept in sync with lat/lng
+    # Denormalized pointers to the newest observation and assessment, kept
+    # current by insert hooks so serializing a location needs no history scan
+    latest_weather_id = db.Column(db.Integer)
+    latest_risk_level = db.Column(db.String(20))
+    latest_risk_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    weather_observations = db.relationship('WeatherData', backref='location', lazy='dynamic', cascade='all, delete-orphan')
+    risk_assessments = db.relationship('RiskAssessment', backref='location', lazy=True, cascade='all, delete-orphan')
+    history_rollups = db.relationship('HistoryRollup', lazy='dynamic', cascade='all, delete-orphan')
+    latest_weather = db.relationship(
+        'WeatherData', primaryjoin='foreign(Location.latest_weather_id) == WeatherData.id',
+        viewonly=True, uselist=False
+    )
+
+    @property
+    def weather_data(self):
+        """Most recent weather observation (the refresh scheduler keeps appending new ones)"""
+        return self.latest_weather
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'description': self.description,
+            'elevation': self.elevation,
+            'rainfall_history': self.rainfall_history,
+            'average_rainfall': self.average_rainfall,
+            'weather_data': self.weather_data.to_dict() if self.weather_data else None,
+            'risk_level': self.latest_risk_level,
+            'timestamp': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+@db.event.listens_for(Location, 'before_insert')
+@db.event.listens_for(Location, 'before_update')
+def _set_geohash(mapper, connection, location):
+    if location.latitude is not None and location.longitude is not None:
+        location.geohash = geohash_encode(location.latitude, location.longitude)
+
+class TableVersion(db.Model):
+    """
+    Per-table change counter, bumped whenever rows of a tracked table are
+    inserted, updated or deleted. Lets read endpoints build ETags without
+    touching the rows themselves.
+    """
+    __tablename__ = 'table_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+def table_version(name):
+    row = db.session.get(TableVersion, name)
+    return row.version if row else 0
+
+def bump_table_version(connection, name):
+    """Increment a table's version on ``connection`` (for writes that bypass the ORM)"""
+    table = TableVersion.__table__
+    result = connection.execute(
+        table.update().where(table.c.name == name).values(version=table.c.version + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(name=name, version=1))
+
+@db.event.listens_for(db.orm.Session, 'after_flush')
+def _bump_location_version(session, flush_context):
+    changed = any(isinstance(obj, Location) for obj in session.new) or \
+        any(isinstance(obj, Location) for obj in session.deleted) or \
+        any(isinstance(obj, Location) and session.is_modified(obj, include_collections=False) for obj in session.dirty)
+    if changed:
+        bump_table_version(session.connection(), Location.__tablename__)
+
+class WeatherData(db.Model):
+    __tablename__ = 'weather_data'
+    __table_args__ = (db.Index('ix_weather_data_location_timestamp', 'location_id', 'timestamp'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False)
+    rainfall = db.Column(db.Float, default=0)
+    water_level = db.Column(db.Float, default=0)
+    temperature = db.Column(db.Float)
+    humidity = db.Column(db.Float)
+    wind_speed = db.Column(db.Float)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'location_id': self.location_id,
+            'rainfall': self.rainfall,
+            'water_level': self.water_level,
+            'temperature': self.temperature,
+            'humidity': self.humidity,
+            'wind_speed': self.wind_speed,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None
+        }
+
+class RiskAssessment(db.Model):
+    __tablename__ = 'risk_assessments'
+    __table_args__ = (db.Index('ix_risk_assessments_location_timestamp', 'location_id', 'timestamp'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False)
+    risk_level = db.Column(db.String(20), nullable=False)  # 'low', 'medium', 'high'
+    total_risk_score = db.Column(db.Integer)
+    water_level = db.Column(db.Float)
+    details = db.Column(db.JSON)  # full assessment payload as returned by the API
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'location_id': self.location_id,
+            'risk_level': self.risk_level,
+            'total_risk_score': self.total_risk_score,
+            'water_level': self.water_level,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None
+        }
+
+@db.event.listens_for(WeatherData, 'after_insert')
+def _track_latest_weather(mapper, connection, observation):
+    locations, weather = Location.__table__, WeatherData.__table__
+    current = db.select(weather.c.timestamp).where(weather.c.id == locations.c.latest_weather_id).scalar_subquery()
+    connection.execute(
+        locations.update()
+        .where(locations.c.id == observation.location_id)
+        .where(db.or_(locations.c.latest_weather_id.is_(None), current <= observation.timestamp))
+        .values(latest_weather_id=observation.id, updated_at=locations.c.updated_at)
+    )
+
+@db.event.listens_for(RiskAssessment, 'after_insert')
+def _track_latest_risk(mapper, connection, assessment):
+    locations = Location.__table__
+    connection.execute(
+        locations.update()
+        .where(locations.c.id == assessment.location_id)
+        .where(db.or_(locations.c.latest_risk_at.is_(None), locations.c.latest_risk_at <= assessment.timestamp))
+        .values(latest_risk_level=assessment.risk_level, latest_risk_at=assessment.timestamp,
+                updated_at=locations.c.updated_at)
+    )
+
+# Bucket start for each rollup resolution
+ROLLUP_RESOLUTIONS = {
+    'hour': lambda ts: ts.replace(minute=0, second=0, microsecond=0),
+    'day': lambda ts: ts.replace(hour=0, minute=0, second=0, microsecond=0)
+}
+RISK_LEVEL_COLUMNS = {'high': 'risk_high', 'medium': 'risk_medium', 'low': 'risk_low'}
+
+class HistoryRollup(db.Model):
+    """
+    Hourly and daily aggregates of WeatherData and RiskAssessment rows.
+
+    Every column is a sum, count, min or max, so a bucket can be updated
+    incrementally as observations are inserted; averages are derived on read.
+    """
+    __tablename__ = 'history_rollups'
+
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), primary_key=True)
+    resolution = db.Column(db.String(8), primary_key=True)  # 'hour' or 'day'
+    bucket = db.Column(db.DateTime, primary_key=True)  # start of the bucket (UTC)
+    weather_count = db.Column(db.Integer, nullable=False, default=0)
+    rainfall_sum = db.Column(db.Float, nullable=False, default=0)
+    rainfall_max = db.Column(db.Float)
+    water_level_sum = db.Column(db.Float, nullable=False, default=0)
+    water_level_max = db.Column(db.Float)
+    temperature_sum = db.Column(db.Float, nullable=False, default=0)
+    temperature_count = db.Column(db.Integer, nullable=False, default=0)
+    temperature_min = db.Column(db.Float)
+    temperature_max = db.Column(db.Float)
+    humidity_sum = db.Column(db.Float, nullable=False, default=0)
+    humidity_count = db.Column(db.Integer, nullable=False, default=0)
+    wind_speed_max = db.Column(db.Float)
+    risk_count = db.Column(db.Integer, nullable=False, default=0)
+    risk_score_sum = db.Column(db.Float, nullable=False, default=0)
+    risk_score_count = db.Column(db.Integer, nullable=False, default=0)
+    risk_score_max = db.Column(db.Float)
+    risk_high = db.Column(db.Integer, nullable=False, default=0)
+    risk_medium = db.Column(db.Integer, nullable=False, default=0)
+    risk_low = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        def average(total, count):
+            return round(total / count, 2) if count else None
+        return {
+            'timestamp': self.bucket.isoformat(),
+            'weather': {
+                'count': self.weather_count,
+                'rainfall_total': round(self.rainfall_sum, 2),
+                'rainfall_max': self.rainfall_max,
+                'water_level_avg': average(self.water_level_sum, self.weather_count),
+                'water_level_max': self.water_level_max,
+                'temperature_avg': average(self.temperature_sum, self.temperature_count),
+                'temperature_min': self.temperature_min,
+                'temperature_max': self.temperature_max,
+                'humidity_avg': average(self.humidity_sum, self.humidity_count),
+                'wind_speed_max': self.wind_speed_max
+            },
+            'risk': {
+                'count': self.risk_count,
+                'score_avg': average(self.risk_score_sum, self.risk_score_count),
+                'score_max': self.risk_score_max,
+                'levels': {level: getattr(self, column) for level, column in RISK_LEVEL_COLUMNS.items()}
+            }
+        }
+
+def _weather_contribution(observation):
+    values = {
+        'weather_count': 1,
+        'rainfall_sum': observation.rainfall or 0,
+        'rainfall_max': observation.rainfall or 0,
+        'water_level_sum': observation.water_level or 0,
+        'water_level_max': observation.water_level or 0,
+        'wind_speed_max': observation.wind_speed
+    }
+    if observation.temperature is not None:
+        values.update(temperature_sum=observation.temperature, temperature_count=1,
+                      temperature_min=observation.temperature, temperature_max=observation.temperature)
+    if observation.humidity is not None:
+        values.update(humidity_sum=observation.humidity, humidity_count=1)
+    return values
+
+def _risk_contribution(assessment):
+    values = {'risk_count': 1}
+    if assessment.total_risk_score is not None:
+        values.update(risk_score_sum=assessment.total_risk_score, risk_score_count=1,
+                      risk_score_max=assessment.total_risk_score)
+    column = RISK_LEVEL_COLUMNS.get((assessment.risk_level or '').lower())
+    if column:
+        values[column] = 1
+    return values
+
+def _combine(name, current, new):
+    # min/max columns keep the extreme, everything else accumulates
+    if name.endswith('_max'):
+        return new if current is None or (new is not None and new > current) else current
+    if name.endswith('_min'):
+        return new if current is None or (new is not None and new < current) else current
+    return (current or 0) + new
+
+def _combine_sql(name, current, new):
+    if name.endswith('_max') or name.endswith('_min'):
+        better = new > current if name.endswith('_max') else new < current
+        return db.case((new.is_(None), current), (db.or_(current.is_(None), better), new), else_=current)
+    return current + new
+
+def _upsert_rollups(connection, location_id, timestamp, values):
+    table = HistoryRollup.__table__
+    dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+    for resolution, bucket_of in ROLLUP_RESOLUTIONS.items():
+        statement = dialect.insert(table).values(
+            location_id=location_id, resolution=resolution, bucket=bucket_of(timestamp), **values
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=['location_id', 'resolution', 'bucket'],
+            set_={name: _combine_sql(name, table.c[name], statement.excluded[name]) for name in values}
+        )
+        connection.execute(statement)
+
+@db.event.listens_for(WeatherData, 'after_insert')
+def _roll_up_weather(mapper, connection, observation):
+    _upsert_rollups(connection, observation.location_id, observation.timestamp, _weather_contribution(observation))
+
+@db.event.listens_for(RiskAssessment, 'after_insert')
+def _roll_up_risk(mapper, connection, assessment):
+    _upsert_rollups(connection, assessment.location_id, assessment.timestamp, _risk_contribution(assessment))
+
+def backfill_rollups():
+    """Build rollups from the raw tables when the rollup table is still empty"""
+    if db.session.query(HistoryRollup.location_id).first() is not None:
+        return
+    buckets = {}
+    sources = ((WeatherData, _weather_contribution), (RiskAssessment, _risk_contribution))
+    for model, contribution in sources:
+        for row in model.query.filter(model.timestamp.isnot(None)).yield_per(1000):
+            values = contribution(row)
+            for resolution, bucket_of in ROLLUP_RESOLUTIONS.items():
+                key = (row.location_id, resolution, bucket_of(row.timestamp))
+                totals = buckets.setdefault(key, {})
+                for name, value in values.items():
+                    totals[name] = _combine(name, totals.get(name), value)
+    if buckets:
+        db.session.execute(db.insert(HistoryRollup), [
+            dict(totals, location_id=key[0], resolution=key[1], bucket=key[2]) for key, totals in buckets.items()
+        ])
+    db.session.commit()
+
+def prune_history(raw_retention_days, hourly_retention_days, now=None):
+    """
+    Apply the retention policy: raw observations older than
+    ``raw_retention_days`` and hourly rollups older than
+    ``hourly_retention_days`` are deleted (daily rollups are kept), except
+    each location's latest observation. Returns the number of rows removed
+    per table.
+    """
+    now = now or datetime.utcnow()
+    raw_cutoff = now - timedelta(days=raw_retention_days)
+    hourly_cutoff = now - timedelta(days=hourly_retention_days)
+    latest_weather = db.select(Location.latest_weather_id).where(Location.latest_weather_id.isnot(None))
+    removed = {
+        'weather_data': db.session.execute(
+            db.delete(WeatherData)
+            .where(WeatherData.timestamp < raw_cutoff)
+            .where(WeatherData.id.not_in(latest_weather))
+        ).rowcount,
+        'risk_assessments': db.session.execute(
+            db.delete(RiskAssessment).where(RiskAssessment.timestamp < raw_cutoff)
+        ).rowcount,
+        'history_rollups': db.session.execute(
+            db.delete(HistoryRollup)
+            .where(HistoryRollup.resolution == 'hour')
+            .where(HistoryRollup.bucket < hourly_cutoff)
+        ).rowcount
+    }
+    db.session.commit()
+    return removed
+
@@ -1,31 +0,0 @@
-from datetime import datetime
-from geoalchemy2 import Geometry
-from app import db
-
-class Location(db.Model):
-    __tablename__ = 'locations'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    description = db.Column(db.Text)
-    latitude = db.Column(db.Float, nullable=False)
-    longitude = db.Column(db.Float, nullable=False)
-    elevation = db.Column(db.Float)  # in meters
-    geometry = db.Column(Geometry('POINT'))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
-    # Relationships
-    weather_data = db.relationship('WeatherData', backref='location', lazy=True)
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'elevation': self.elevation,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        } 
\ No newline at end of file
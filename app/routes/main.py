@@ -1,92 +1,1145 @@
-from flask import Blueprint, render_template, jsonify, request
-from app.models.location import Location
-from app.models.weather_data import WeatherData
-from app.utils.flood_prediction import predict_flood_risk
-from app.utils.gis_data import fetch_and_store_gis_data
-from app import db
+from functools import partial
+from flask import Blueprint, current_app, request, jsonify, render_template, stream_with_context, url_for
+from app.models import (
+    db, Location, WeatherData, RiskAssessment, HistoryRollup, ROLLUP_RESOLUTIONS,
+    prune_history, table_version, bump_table_version
+)
+from datetime import datetime, timedelta, timezone
+import asyncio
+import json
+import logging
+import os
+import requests
+import zlib
+from sqlalchemy import case, func, or_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload, load_only
+from app.utils import (
+    async_upstream, weather_api, elevation_store, osm_context, risk_engine, importers, exporters, spatial, metrics,
+    timing, write_behind
+)
+from app.utils.quota import BACKGROUND, INTERACTIVE
+from app.utils.weather_api import WeatherAPIError
+from app.utils.cache import MISS, TTLCache
+from app.utils.scheduler import RefreshScheduler
+from app.utils.write_behind import WriteBehindQueue
+from app.utils.geo import geohash_encode, haversine_km, in_bbox
 
-bp = Blueprint('main', __name__)
+logger = logging.getLogger(__name__)
 
-@bp.route('/')
+bp = Blueprint('main', __name__, cli_group=None)
+
+# Short-lived cache of share payloads keyed on location_id
+share_cache = TTLCache()
+
+# Background workers, created per app by init_app
+risk_writer = None
+osm_prefetcher = None
+refresh_scheduler = None
+history_pruner = None
+
+def write_risk_records(app, records):
+    """Insert a batch of RiskAssessment records in one transaction"""
+    with app.app_context():
+        db.session.add_all(records)
+        db.session.commit()
+
+def prefetch_osm_context(points):
+    """Fetch the OSM drainage context of a batch of new (lat, lng) points"""
+    fetched = 0
+    for lat, lng in dict.fromkeys(points):
+        try:
+            fetched += osm_context.prefetch(lat, lng)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning("Error fetching OSM context for %s,%s: %s", lat, lng, e)
+    logger.debug("Fetched %d OSM tiles for %d new locations", fetched, len(points))
+
+def queue_osm_prefetch(points):
+    """Queue an OSM context fetch for new locations (see OSM_PREFETCH_ON_CREATE)"""
+    if current_app.config["OSM_PREFETCH_ON_CREATE"]:
+        for point in points:
+            osm_prefetcher.submit(point)
+
+@bp.route("/")
 def index():
-    """Render the main map page."""
-    return render_template('index.html')
+    # Get weather API key
+    weather_api_key = os.getenv('WEATHER_API_KEY')
+    if not weather_api_key:
+        logger.warning("WEATHER_API_KEY not found in environment variables")
+        weather_api_key = ""  # Set empty string as fallback
+    
+    # Pass the weather API key to the template
+    return render_template("index.html", weather_api_key=weather_api_key)
 
-@bp.route('/api/locations', methods=['POST'])
-def create_location():
+@bp.route("/forecast")
+def forecast():
+    # Get weather API key
+    weather_api_key = os.getenv('WEATHER_API_KEY')
+    if not weather_api_key:
+        weather_api_key = ""
+    
+    # Get location from query parameters if provided
+    lat = request.args.get('lat')
+    lng = request.args.get('lng')
+    
+    return render_template("forecast.html", 
+                         weather_api_key=weather_api_key,
+                         lat=lat,
+                         lng=lng)
+
+@bp.route("/locations")
+def locations():
+    # Get weather API key
+    weather_api_key = os.getenv('WEATHER_API_KEY')
+    if not weather_api_key:
+        weather_api_key = ""
+    
+    return render_template("locations.html", weather_api_key=weather_api_key)
+
+# API field name -> Location column, for ?fields= projection on the list endpoints
+LOCATION_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'description': 'description',
+    'lat': 'latitude',
+    'lng': 'longitude',
+    'elevation': 'elevation',
+    'average_rainfall': 'average_rainfall',
+    'rainfall_history': 'rainfall_history',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at'
+}
+SUMMARY_FIELDS = ('id', 'name', 'description', 'lat', 'lng', 'elevation', 'created_at', 'updated_at')
+
+def location_summary(location, fields=SUMMARY_FIELDS):
+    data = {}
+    for field in fields:
+        value = getattr(location, LOCATION_FIELDS[field])
+        data[field] = value.isoformat() if isinstance(value, datetime) else value
+    return data
+
+def location_columns(fields):
+    """Columns to load for ``fields`` (id and coordinates are always needed)"""
+    names = {'id', 'latitude', 'longitude'} | {LOCATION_FIELDS[field] for field in fields}
+    return [getattr(Location, name) for name in names]
+
+def locations_in_bbox(min_lat, min_lng, max_lat, max_lng):
+    """
+    Locations inside a bounding box (min_lng > max_lng wraps the antimeridian).
+    Candidates come from the spatial index and are then checked exactly.
+    """
+    query = spatial.bbox_filter(Location.query, min_lat, min_lng, max_lat, max_lng)
+    return [
+        location for location in query.order_by(Location.id).all()
+        if in_bbox(location.latitude, location.longitude, min_lat, min_lng, max_lat, max_lng)
+    ]
+
+def parse_bbox(value):
+    """Parse a "min_lng,min_lat,max_lng,max_lat" query parameter"""
+    min_lng, min_lat, max_lng, max_lat = (float(part) for part in value.split(","))
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+        raise ValueError("bbox out of range")
+    return min_lat, min_lng, max_lat, max_lng
+
+def parse_fields(value):
+    """Parse a comma-separated ?fields= list, defaulting to the summary fields"""
+    if not value:
+        return SUMMARY_FIELDS
+    fields = tuple(dict.fromkeys(part.strip() for part in value.split(",") if part.strip()))
+    unknown = [field for field in fields if field not in LOCATION_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+@bp.route("/api/locations", methods=["GET"])
+def get_locations():
     """
-    Create a new location with GIS data
+    List locations. Optional query parameters:
+      bbox=min_lng,min_lat,max_lng,max_lat  only locations inside the box
+      fields=id,name,lat,lng                 only these keys (and columns)
+      limit=N&cursor=C                       keyset pagination by id; the
+                                             next cursor is returned in the
+                                             X-Next-Cursor and Link headers
+    Responses carry an ETag derived from the locations table version, so an
+    unchanged reload with If-None-Match gets a 304 without reading any rows.
     """
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        required_fields = ['name', 'latitude', 'longitude']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
-        
-        # Create location with GIS data
-        location = fetch_and_store_gis_data(
-            lat=float(data['latitude']),
-            lon=float(data['longitude']),
-            name=data['name'],
-            description=data.get('description', '')
-        )
+        try:
+            fields = parse_fields(request.args.get("fields"))
+        except ValueError as e:
+            return jsonify({"error": str(e), "allowed": sorted(LOCATION_FIELDS)}), 400
+
+        bbox = request.args.get("bbox")
+        bounds = None
+        if bbox:
+            try:
+                bounds = parse_bbox(bbox)
+            except ValueError:
+                return jsonify({"error": "bbox must be min_lng,min_lat,max_lng,max_lat"}), 400
+
+        limit = request.args.get("limit", type=int)
+        cursor = request.args.get("cursor", type=int)
+        if limit is not None and not 1 <= limit <= current_app.config['LOCATIONS_PAGE_MAX']:
+            return jsonify({"error": f"limit must be between 1 and {current_app.config['LOCATIONS_PAGE_MAX']}"}), 400
+
+        etag = f"locations-{table_version(Location.__tablename__)}-{zlib.crc32(request.query_string):08x}"
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+
+        query = Location.query.options(load_only(*location_columns(fields)))
+        if bounds:
+            logger.debug("Fetching locations in bbox %s", bounds)
+            query = spatial.bbox_filter(query, *bounds)
+        else:
+            logger.debug("Fetching all locations")
+        if cursor is not None:
+            query = query.filter(Location.id > cursor)
+        query = query.order_by(Location.id)
+        if limit is not None and not bounds:
+            query = query.limit(limit + 1)
+
+        locations = []
+        for location in query.yield_per(500):
+            if bounds and not in_bbox(location.latitude, location.longitude, *bounds):
+                continue
+            locations.append(location)
+            if limit is not None and len(locations) > limit:
+                break
+
+        next_cursor = None
+        if limit is not None and len(locations) > limit:
+            locations = locations[:limit]
+            next_cursor = locations[-1].id
+        logger.debug("Found %d locations", len(locations))
         
-        return jsonify(location.to_dict()), 201
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        locations_data = [location_summary(location, fields) for location in locations]
 
-@bp.route('/api/locations', methods=['GET'])
-def get_locations():
+        response = jsonify(locations_data)
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "no-cache"
+        if next_cursor is not None:
+            args = request.args.to_dict()
+            args["cursor"] = next_cursor
+            response.headers["X-Next-Cursor"] = str(next_cursor)
+            response.headers["Link"] = f'<{url_for("main.get_locations", **args)}>; rel="next"'
+        return response
+    except Exception:
+        logger.exception("Error in get_locations")
+        return jsonify({"error": "Internal server error"}), 500
+
+@bp.route("/api/locations/nearby", methods=["GET"])
+def get_nearby_locations():
     """
-    Get all locations
+    Locations within radius_km of (lat, lng), nearest first, each with its
+    haversine distance_km
     """
     try:
-        locations = Location.query.all()
-        return jsonify([location.to_dict() for location in locations])
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        try:
+            lat = float(request.args["lat"])
+            lng = float(request.args["lng"])
+            radius_km = float(request.args.get("radius_km", 1))
+            limit = int(request.args.get("limit", 100))
+        except (KeyError, ValueError):
+            return jsonify({"error": "lat, lng and a numeric radius_km are required"}), 400
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180) or radius_km <= 0 or limit <= 0:
+            return jsonify({"error": "Coordinates, radius_km or limit out of range"}), 400
+
+        nearby = []
+        candidates = spatial.radius_filter(Location.query, lat, lng, radius_km)
+        for location in candidates.order_by(Location.id).all():
+            distance = haversine_km(lat, lng, location.latitude, location.longitude)
+            if distance <= radius_km:
+                nearby.append((distance, location))
+        nearby.sort(key=lambda pair: pair[0])
 
-@bp.route('/api/locations/<int:location_id>', methods=['GET'])
+        return jsonify([
+            dict(location_summary(location), distance_km=round(distance, 3))
+            for distance, location in nearby[:limit]
+        ])
+    except Exception:
+        logger.exception("Error in get_nearby_locations")
+        return jsonify({"error": "Internal server error"}), 500
+
+@bp.route("/api/locations/<int:location_id>", methods=["GET"])
 def get_location(location_id):
+    try:
+        location = Location.query.options(joinedload(Location.latest_weather)).get_or_404(location_id)
+        return jsonify(location.to_dict())
+    except SQLAlchemyError:
+        logger.exception("Database error in get_location")
+        return jsonify({"error": "Database error occurred"}), 500
+    except Exception:
+        logger.exception("Unexpected error in get_location")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+HISTORY_RESOLUTIONS = ('raw', 'hour', 'day')
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 timestamp into a naive UTC datetime"""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+@bp.route("/api/locations/<int:location_id>/history", methods=["GET"])
+def get_location_history(location_id):
     """
-    Get a specific location by ID
+    Weather and risk history for a location between ``from`` and ``to``
+    (ISO 8601, default the last 7 days). ``resolution`` is raw, hour or day;
+    it defaults to hour for ranges up to HISTORY_HOURLY_MAX_DAYS and day
+    beyond that. Hourly and daily ranges are served from the rollup table.
     """
     try:
         location = Location.query.get_or_404(location_id)
-        return jsonify(location.to_dict())
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        try:
+            end = parse_timestamp(request.args["to"]) if request.args.get("to") else datetime.utcnow()
+            start = parse_timestamp(request.args["from"]) if request.args.get("from") else end - timedelta(days=7)
+        except ValueError:
+            return jsonify({"error": "from and to must be ISO 8601 timestamps"}), 400
+        if start > end:
+            return jsonify({"error": "from must not be after to"}), 400
+
+        resolution = request.args.get("resolution")
+        if resolution is None:
+            resolution = "hour" if end - start <= timedelta(days=current_app.config["HISTORY_HOURLY_MAX_DAYS"]) else "day"
+        if resolution not in HISTORY_RESOLUTIONS:
+            return jsonify({"error": f"resolution must be one of {', '.join(HISTORY_RESOLUTIONS)}"}), 400
+
+        max_points = current_app.config["HISTORY_MAX_POINTS"]
+        result = {
+            "location_id": location.id,
+            "resolution": resolution,
+            "from": start.isoformat(),
+            "to": end.isoformat()
+        }
+        if resolution == "raw":
+            for key, model in (("weather", WeatherData), ("risk_assessments", RiskAssessment)):
+                rows = (
+                    model.query
+                    .filter(model.location_id == location.id, model.timestamp >= start, model.timestamp <= end)
+                    .order_by(model.timestamp, model.id)
+                    .limit(max_points + 1)
+                    .all()
+                )
+                result[key] = [row.to_dict() for row in rows[:max_points]]
+                result["truncated"] = result.get("truncated", False) or len(rows) > max_points
+        else:
+            rollups = (
+                location.history_rollups
+                .filter(HistoryRollup.resolution == resolution,
+                        HistoryRollup.bucket >= ROLLUP_RESOLUTIONS[resolution](start),
+                        HistoryRollup.bucket <= end)
+                .order_by(HistoryRollup.bucket)
+                .limit(max_points + 1)
+                .all()
+            )
+            result["points"] = [rollup.to_dict() for rollup in rollups[:max_points]]
+            result["truncated"] = len(rollups) > max_points
+        return jsonify(result)
+    except SQLAlchemyError:
+        logger.exception("Database error in get_location_history")
+        return jsonify({"error": "Database error occurred"}), 500
+
+@bp.route("/api/locations", methods=["POST"])
+def create_location():
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+
+        location = Location(
+            name=data.get("name", "Unknown Location"),
+            latitude=data.get("latitude", 0),
+            longitude=data.get("longitude", 0),
+            description=data.get("description", ""),
+            elevation=data.get("elevation"),
+            rainfall_history=data.get("rainfall_history", []),
+            average_rainfall=data.get("average_rainfall", 0)
+        )
+        db.session.add(location)
+        db.session.commit()
+
+        # Create initial weather data
+        weather_data = WeatherData(
+            location_id=location.id,
+            rainfall=0,
+            water_level=0,
+            temperature=0,
+            humidity=0,
+            wind_speed=0
+        )
+        db.session.add(weather_data)
+        db.session.commit()
+        queue_osm_prefetch([(location.latitude, location.longitude)])
+
+        return jsonify(location.to_dict()), 201
+    except SQLAlchemyError:
+        db.session.rollback()
+        logger.exception("Database error in create_location")
+        return jsonify({"error": "Database error occurred"}), 500
+    except Exception:
+        db.session.rollback()
+        logger.exception("Unexpected error in create_location")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+def insert_location_chunk(rows):
+    """
+    Insert validated import rows in one transaction. Missing elevations are
+    resolved in one batched lookup (its upstream requests run concurrently)
+    and stay NULL when they cannot be resolved.
+    The ORM insert hooks are bypassed, so geohashes and the table version
+    are maintained here.
+    """
+    elevations = async_upstream.run(elevation_store.resolve_elevations_async(
+        [(row["latitude"], row["longitude"]) for row in rows],
+        [row["elevation"] for row in rows]
+    ))
+    now = datetime.utcnow()
+    db.session.execute(db.insert(Location), [
+        dict(
+            row,
+            elevation=elevation,
+            geohash=geohash_encode(row["latitude"], row["longitude"]),
+            rainfall_history=[],
+            average_rainfall=0,
+            created_at=now,
+            updated_at=now
+        )
+        for row, elevation in zip(rows, elevations)
+    ])
+    bump_table_version(db.session.connection(), Location.__tablename__)
+    db.session.commit()
+    queue_osm_prefetch([(row["latitude"], row["longitude"]) for row in rows])
+    return len(rows)
+
+def import_location_events(rows, chunk_size):
+    """
+    Consume ``(row_number, values)`` pairs from importers.read_rows,
+    inserting valid rows ``chunk_size`` at a time. Yields an error event per
+    rejected row, a progress event per committed chunk and a final summary.
+    """
+    processed = inserted = failed = 0
+    chunk = []
+    aborted = None
+    rows = iter(rows)
+    while True:
+        try:
+            row_number, values = next(rows, (None, None))
+        except ValueError as e:
+            # The stream itself is malformed; keep what was read so far
+            aborted = str(e)
+            row_number = None
+        if row_number is not None:
+            processed += 1
+            if isinstance(values, ValueError):
+                failed += 1
+                yield {"type": "error", "row": row_number, "error": str(values)}
+                continue
+            chunk.append((row_number, values))
+        if chunk and (len(chunk) >= chunk_size or row_number is None):
+            try:
+                inserted += insert_location_chunk([values for _, values in chunk])
+            except SQLAlchemyError:
+                db.session.rollback()
+                failed += len(chunk)
+                logger.exception("Database error in import_locations")
+                yield {"type": "error", "rows": [chunk[0][0], chunk[-1][0]], "error": "Database error occurred"}
+            chunk = []
+            yield {"type": "progress", "processed": processed, "inserted": inserted, "failed": failed}
+        if row_number is None:
+            break
+    if aborted:
+        yield {"type": "error", "row": None, "error": aborted}
+    yield {"type": "summary", "processed": processed, "inserted": inserted, "failed": failed, "aborted": aborted is not None}
+
+@bp.route("/api/locations/import", methods=["POST"])
+def import_locations():
+    """
+    Bulk-import locations from a CSV, GeoJSON FeatureCollection or NDJSON
+    body (chosen by ?format= or Content-Type). The body is parsed as it
+    streams in and rows are committed in chunks of IMPORT_CHUNK_SIZE.
+    Clients accepting application/x-ndjson get progress and per-row error
+    events as they happen; everyone else gets a JSON summary with the first
+    IMPORT_MAX_ERRORS errors.
+    """
+    try:
+        fmt = importers.detect_format(request.args.get("format"), request.content_type)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    events = import_location_events(importers.read_rows(request.stream, fmt), current_app.config["IMPORT_CHUNK_SIZE"])
+
+    if request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"]) == "application/x-ndjson":
+        return current_app.response_class(
+            stream_with_context(json.dumps(event) + "\n" for event in events),
+            mimetype="application/x-ndjson"
+        )
+
+    errors = []
+    for event in events:
+        if event["type"] == "error" and len(errors) < current_app.config["IMPORT_MAX_ERRORS"]:
+            errors.append({key: value for key, value in event.items() if key != "type"})
+        elif event["type"] == "summary":
+            summary = event
+    logger.info("Imported %d of %d locations", summary['inserted'], summary['processed'])
+    del summary["type"]
+    summary["errors"] = errors
+    if summary["inserted"]:
+        return jsonify(summary), 201
+    return jsonify(summary), 422 if summary["failed"] else 200
+
+def export_rows(columns, bounds=None, batch_size=1000):
+    """
+    Yield batches of export rows, reading through a chunked cursor so only
+    ``batch_size`` rows are held at a time. Risk and weather columns come
+    from the denormalized latest-* pointers on Location.
+    """
+    selected = [Location.__table__.c[name] for name in exporters.BASE_COLUMNS]
+    if "risk_level" in columns:
+        selected += [Location.latest_risk_level.label("risk_level"), Location.latest_risk_at.label("risk_assessed_at")]
+    if "rainfall" in columns:
+        weather = WeatherData.__table__
+        selected += [weather.c[name] for name in ("rainfall", "water_level", "temperature", "humidity", "wind_speed")]
+        selected.append(weather.c.timestamp.label("weather_observed_at"))
+    query = db.select(*selected).select_from(Location)
+    if "rainfall" in columns:
+        query = query.outerjoin(WeatherData, WeatherData.id == Location.latest_weather_id)
+    if bounds:
+        query = spatial.bbox_filter(query, *bounds)
+    query = query.order_by(Location.id).execution_options(yield_per=batch_size)
+
+    for partition in db.session.execute(query).mappings().partitions():
+        yield [
+            dict(row) for row in partition
+            if not bounds or in_bbox(row["latitude"], row["longitude"], *bounds)
+        ]
+
+@bp.route("/api/export", methods=["GET"])
+def export_locations():
+    """
+    Stream all locations as GeoJSON (default), NDJSON, CSV or Parquet
+    (?format=). ``include=risk,weather`` adds the latest risk level and
+    weather observation; ``bbox=`` limits the export to a viewport. Rows are
+    read and written in batches of EXPORT_BATCH_SIZE, so memory use does
+    not grow with the table.
+    """
+    fmt = request.args.get("format", "geojson")
+    if fmt not in exporters.EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(exporters.EXPORT_FORMATS)}"}), 400
+    if not exporters.available(fmt):
+        return jsonify({"error": "Parquet export requires the pyarrow package"}), 501
 
-@bp.route('/api/weather-data', methods=['GET'])
+    include = {part.strip() for part in request.args.get("include", "").split(",") if part.strip()}
+    if include - {"risk", "weather"}:
+        return jsonify({"error": "include may contain risk and weather"}), 400
+    bounds = None
+    if request.args.get("bbox"):
+        try:
+            bounds = parse_bbox(request.args["bbox"])
+        except ValueError:
+            return jsonify({"error": "bbox must be min_lng,min_lat,max_lng,max_lat"}), 400
+
+    columns = exporters.export_columns("risk" in include, "weather" in include)
+    batches = export_rows(columns, bounds, current_app.config["EXPORT_BATCH_SIZE"])
+    mimetype, extension = exporters.EXPORT_FORMATS[fmt]
+    logger.debug("Exporting locations as %s", fmt)
+    response = current_app.response_class(
+        stream_with_context(exporters.WRITERS[fmt](batches, columns)),
+        mimetype=mimetype
+    )
+    response.headers["Content-Disposition"] = f"attachment; filename=locations.{extension}"
+    return response
+
+@bp.route("/api/weather-data", methods=["GET"])
 def get_weather_data():
-    """Get weather data for a specific location."""
-    location_id = request.args.get('location_id')
-    if not location_id:
-        return jsonify({'error': 'Location ID is required'}), 400
-    
-    weather_data = WeatherData.query.filter_by(location_id=location_id).first()
-    if not weather_data:
-        return jsonify({'error': 'Weather data not found'}), 404
-    
-    return jsonify(weather_data.to_dict())
-
-@bp.route('/api/predict-flood-risk', methods=['POST'])
-def predict_risk():
-    """Predict flood risk for a given location."""
-    data = request.get_json()
-    if not data or 'location_id' not in data:
-        return jsonify({'error': 'Location ID is required'}), 400
-    
-    location = Location.query.get(data['location_id'])
-    if not location:
-        return jsonify({'error': 'Location not found'}), 404
-    
-    risk_level = predict_flood_risk(location)
-    return jsonify({
-        'location_id': location.id,
-        'risk_level': risk_level,
-        'timestamp': location.updated_at.isoformat()
-    }) 
\ No newline at end of file
+    try:
+        location_id = request.args.get("location_id")
+        if not location_id:
+            return jsonify({"error": "Location ID is required"}), 400
+
+        weather_data = WeatherData.query.filter_by(location_id=location_id).order_by(
+            WeatherData.timestamp.desc(), WeatherData.id.desc()
+        ).first()
+        if not weather_data:
+            # Create new weather data if it doesn't exist
+            weather_data = WeatherData(location_id=location_id)
+            db.session.add(weather_data)
+            db.session.commit()
+
+        return jsonify(weather_data.to_dict())
+    except SQLAlchemyError:
+        db.session.rollback()
+        logger.exception("Database error in get_weather_data")
+        return jsonify({"error": "Database error occurred"}), 500
+    except Exception:
+        db.session.rollback()
+        logger.exception("Unexpected error in get_weather_data")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+def calculate_flood_risk(weather_data, elevation, lat, lng):
+    """
+    Score flood risk from a parsed forecast, an elevation and
+    the stored OSM drainage context of the point
+    """
+    return risk_engine.assess_forecasts(
+        [weather_data], [elevation], drainage_risk=osm_context.drainage_risks([(lat, lng)])
+    )[0]
+
+def fetch_risk_inputs(lat, lng, location=None, weather_api_key=None):
+    """
+    Fetch the forecast and resolve the elevation for a point concurrently on
+    the async upstream loop, so latency is that of the slowest upstream.
+    Raises WeatherAPIError if the forecast cannot be fetched.
+    """
+    weather_data, elevation = async_upstream.gather(
+        timing.timed("weather", weather_api.get_forecast_async(lat, lng, weather_api_key)),
+        timing.timed(
+            "elevation", elevation_store.resolve_elevation_async(lat, lng, known=location.elevation if location else None)
+        )
+    )
+    return weather_data, elevation
+
+def assess_flood_risk(lat, lng, location=None, weather_data=None, elevation=None, weather_api_key=None):
+    """
+    In-process flood risk assessment shared by the predict and share routes.
+
+    Uses ``weather_data``/``elevation`` when the caller already holds them,
+    otherwise fetches both concurrently (forecast through the forecast cache,
+    elevation through the elevation store). When a saved ``location`` is given
+    the assessment is recorded: through the write-behind queue (so it becomes
+    visible to latest_assessment within RISK_WRITE_INTERVAL), or in one
+    direct commit together with a newly resolved elevation.
+    Raises WeatherAPIError if the forecast cannot be fetched.
+    """
+    if weather_data is None:
+        weather_data, elevation = fetch_risk_inputs(lat, lng, location, weather_api_key)
+    elif elevation is None:
+        # Get elevation data (stored location elevation, then disk cache, DEM tiles, open-meteo)
+        with timing.phase("elevation"):
+            elevation = elevation_store.resolve_elevation(lat, lng, known=location.elevation if location else None)
+    logger.debug("Weather data received: %r", weather_data)
+    logger.debug("Elevation data received: %s", elevation)
+
+    with timing.phase("score"):
+        risk_assessment = calculate_flood_risk(weather_data, elevation, lat, lng)
+
+    # Save to database if a saved location was given
+    backfill = location is not None and location.elevation is None and elevation is not None
+    if location and current_app.config["RISK_WRITE_BEHIND"] and not backfill:
+        with timing.phase("commit"):
+            risk_writer.submit(build_risk_record(location, risk_assessment))
+    elif location:
+        try:
+            with timing.phase("commit"):
+                if backfill:
+                    # Backfill so later requests for this location skip the lookup entirely
+                    location.elevation = elevation
+                db.session.add(build_risk_record(location, risk_assessment))
+                db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error("Error saving risk assessment to database: %s", e)
+
+    return risk_assessment
+
+@bp.route("/api/predict-flood-risk", methods=["POST"])
+def predict_flood_risk():
+    try:
+        data = request.json
+        logger.debug("Received data: %s", data)
+        
+        location_id = data.get("location_id")
+        lat = data.get("latitude")
+        lng = data.get("longitude")
+        
+        logger.debug(
+            "Predicting flood risk for location %s", location_id, extra={"location_id": location_id, "lat": lat, "lng": lng}
+        )
+        
+        if not lat or not lng:
+            return jsonify({"error": "Latitude and longitude are required"}), 400
+            
+        # Get weather API key
+        weather_api_key = os.getenv('WEATHER_API_KEY')
+        if not weather_api_key:
+            return jsonify({"error": "Weather API key not configured"}), 500
+            
+        location = Location.query.get(location_id) if location_id else None
+        
+        # Serve the scheduler's precomputed assessment when it is recent enough
+        if location and not data.get("refresh"):
+            precomputed = latest_assessment(location)
+            if precomputed:
+                with timing.phase("serialize"):
+                    return jsonify(precomputed)
+        
+        try:
+            risk_assessment = assess_flood_risk(lat, lng, location=location, weather_api_key=weather_api_key)
+        except WeatherAPIError as e:
+            return jsonify({"error": "Failed to fetch weather data"}), e.status_code
+        
+        with timing.phase("serialize"):
+            return jsonify(risk_assessment)
+        
+    except Exception:
+        logger.exception("Error in predict_flood_risk")
+        return jsonify({"error": "Internal server error"}), 500
+
+def build_risk_record(location, risk_assessment):
+    return RiskAssessment(
+        location_id=location.id,
+        risk_level=risk_assessment["risk_level"],
+        total_risk_score=risk_assessment["total_risk_score"],
+        water_level=risk_assessment["water_level"],
+        details=risk_assessment,
+        timestamp=datetime.utcnow()
+    )
+
+def build_weather_record(location, weather_data, risk_assessment):
+    current = weather_data.current
+    return WeatherData(
+        location_id=location.id,
+        rainfall=current.precipitation,
+        water_level=risk_assessment["water_level"],
+        temperature=current.temp,
+        humidity=current.humidity,
+        wind_speed=current.wind_speed,
+        timestamp=datetime.utcnow()
+    )
+
+def latest_assessment(location, max_age=None):
+    """
+    Return the stored assessment payload for a location if one younger than
+    ``max_age`` seconds (default RISK_MAX_AGE) exists, else None
+    """
+    max_age = current_app.config["RISK_MAX_AGE"] if max_age is None else max_age
+    record = RiskAssessment.query.filter_by(location_id=location.id).order_by(RiskAssessment.id.desc()).first()
+    if record and record.details and record.timestamp >= datetime.utcnow() - timedelta(seconds=max_age):
+        return record.details
+    return None
+
+def assess_locations(items, weather_api_key, record_weather=False, priority=INTERACTIVE):
+    """
+    Assess many points at once. ``items`` maps a result key to
+    (lat, lng, location or None). Forecasts are fetched once per forecast
+    grid cell on the async upstream loop (at most BATCH_MAX_WORKERS at a
+    time) while elevations resolve in one batched lookup; everything is
+    scored in one vectorized pass and the RiskAssessment rows (plus
+    WeatherData rows when ``record_weather``) for saved locations are
+    written in a single transaction. Upstream calls are charged to the
+    ``priority`` quota budget. Returns {key: assessment or {"error": ...}}.
+    """
+    results = {}
+    if not items:
+        return results
+
+    # Deduplicate on the forecast grid and fan out upstream fetches
+    cells = list({weather_api.forecast_key(lat, lng) for lat, lng, _ in items.values()})
+    points = [(lat, lng) for lat, lng, _ in items.values()]
+    known = [location.elevation if location else None for _, _, location in items.values()]
+    max_concurrency = current_app.config["BATCH_MAX_WORKERS"]
+
+    async def fetch_all():
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def fetch_cell(cell):
+            async with semaphore:
+                return await weather_api.get_forecast_async(cell[0], cell[1], weather_api_key, priority)
+
+        return await asyncio.gather(
+            elevation_store.resolve_elevations_async(points, known),
+            *[fetch_cell(cell) for cell in cells],
+            return_exceptions=True
+        )
+
+    elevations, *cell_forecasts = async_upstream.run(fetch_all())
+    if isinstance(elevations, Exception):
+        logger.warning("Error resolving batch elevations: %s", elevations)
+        elevations = [None] * len(points)
+    forecasts = {}
+    for cell, forecast in zip(cells, cell_forecasts):
+        if isinstance(forecast, Exception):
+            logger.warning("Error fetching forecast for %s: %s", cell, forecast)
+        forecasts[cell] = forecast
+
+    # Score everything in one vectorized pass
+    scored = []
+    for (key, (lat, lng, location)), elevation in zip(items.items(), elevations):
+        weather_data = forecasts[weather_api.forecast_key(lat, lng)]
+        if isinstance(weather_data, Exception):
+            results[key] = {"error": "Failed to fetch weather data"}
+        else:
+            scored.append((key, location, weather_data, elevation))
+    assessments = risk_engine.assess_forecasts(
+        [weather_data for _, _, weather_data, _ in scored],
+        [elevation for _, _, _, elevation in scored],
+        drainage_risk=osm_context.drainage_risks([(items[key][0], items[key][1]) for key, _, _, _ in scored])
+    )
+
+    # Persist all assessments in one transaction
+    records = []
+    for (key, location, weather_data, elevation), risk_assessment in zip(scored, assessments):
+        results[key] = risk_assessment
+        if location:
+            if location.elevation is None and elevation is not None:
+                location.elevation = elevation
+            records.append(build_risk_record(location, risk_assessment))
+            if record_weather:
+                records.append(build_weather_record(location, weather_data, risk_assessment))
+
+    if records:
+        try:
+            db.session.add_all(records)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error("Error saving batch risk assessments to database: %s", e)
+
+    return results
+
+@bp.route("/api/predict-flood-risk/batch", methods=["POST"])
+def predict_flood_risk_batch():
+    """
+    Predict flood risk for many saved locations and/or raw coordinates at once.
+
+    Body: {"location_ids": [1, 2], "coordinates": [{"id": "a", "latitude": .., "longitude": ..}]}
+    See assess_locations for how upstream fetches, scoring and the single
+    write transaction are batched. Results are keyed by location id
+    (or coordinate id, defaulting to "lat,lng"); failed items carry an "error".
+    """
+    try:
+        data = request.json or {}
+        location_ids = data.get("location_ids") or []
+        coordinates = data.get("coordinates") or []
+
+        if not location_ids and not coordinates:
+            return jsonify({"error": "location_ids or coordinates are required"}), 400
+        if len(location_ids) + len(coordinates) > current_app.config["BATCH_MAX_ITEMS"]:
+            return jsonify({"error": f"At most {current_app.config['BATCH_MAX_ITEMS']} items per batch"}), 400
+
+        weather_api_key = os.getenv('WEATHER_API_KEY')
+        if not weather_api_key:
+            return jsonify({"error": "Weather API key not configured"}), 500
+
+        results = {}
+        items = {}  # result key -> (lat, lng, location or None)
+
+        valid_ids = []
+        for location_id in location_ids:
+            try:
+                valid_ids.append(int(location_id))
+            except (TypeError, ValueError):
+                results[str(location_id)] = {"error": "Invalid location id"}
+        locations = {}
+        if valid_ids:
+            locations = {location.id: location for location in Location.query.filter(Location.id.in_(valid_ids)).all()}
+        for location_id in valid_ids:
+            location = locations.get(location_id)
+            if location is None:
+                results[str(location_id)] = {"error": "Location not found"}
+            else:
+                items[str(location_id)] = (location.latitude, location.longitude, location)
+
+        for point in coordinates:
+            lat = point.get("latitude")
+            lng = point.get("longitude")
+            key = str(point.get("id") or f"{lat},{lng}")
+            try:
+                items[key] = (float(lat), float(lng), None)
+            except (TypeError, ValueError):
+                results[key] = {"error": "Latitude and longitude are required"}
+
+        logger.debug("Batch flood risk for %d items", len(items))
+
+        results.update(assess_locations(items, weather_api_key))
+
+        return jsonify({"results": results})
+
+    except Exception:
+        logger.exception("Error in predict_flood_risk_batch")
+        return jsonify({"error": "Internal server error"}), 500
+
+@bp.route("/api/weather", methods=["GET"])
+def get_weather():
+    try:
+        lat = request.args.get('lat')
+        lng = request.args.get('lng')
+        
+        logger.debug("Weather request received for coordinates %s, %s", lat, lng, extra={"lat": lat, "lng": lng})
+        
+        if not lat or not lng:
+            return jsonify({"error": "Latitude and longitude are required"}), 400
+            
+        # Get weather API key
+        weather_api_key = os.getenv('WEATHER_API_KEY')
+        if not weather_api_key:
+            logger.error("WEATHER_API_KEY not found in environment variables")
+            return jsonify({"error": "Weather API key not configured"}), 500
+            
+        # Fetch weather data from WeatherAPI.com (served from the forecast cache when possible)
+        try:
+            with timing.phase("weather"):
+                data = weather_api.get_forecast(lat, lng, weather_api_key)
+        except WeatherAPIError as e:
+            logger.warning("Weather API error: %s - %s", e.status_code, e.message)
+            return jsonify({"error": "Failed to fetch weather data"}), e.status_code
+            
+        # Current conditions and daily forecast from the parsed forecast
+        current = {
+            "temp": data.current.temp,
+            "weather_description": data.current.description,
+            "weather_icon": data.current.icon,
+            "humidity": data.current.humidity,
+            "wind_speed": data.current.wind_speed,
+            "precipitation": data.current.precipitation
+        }
+        forecast = data.days()
+            
+        # Calculate water level (simplified version)
+        avg_rainfall = float(data.precip.mean()) if data.day_count else 0.0
+        water_level = {
+            "value": avg_rainfall * 0.1,  # Simplified calculation
+            "status": "HIGH" if avg_rainfall > 50 else "MEDIUM" if avg_rainfall > 20 else "LOW"
+        }
+        
+        return jsonify({
+            "current": current,
+            "forecast": forecast,
+            "water_level": water_level
+        })
+        
+    except Exception:
+        logger.exception("Error in get_weather")
+        return jsonify({"error": "Internal server error"}), 500
+
+@bp.route("/api/locations/<int:location_id>", methods=["DELETE"])
+def delete_location(location_id):
+    try:
+        logger.debug("Attempting to delete location %d", location_id)
+        location = Location.query.get_or_404(location_id)
+        db.session.delete(location)
+        db.session.commit()
+        share_cache.invalidate(location_id)
+        logger.info("Deleted location %d", location_id)
+        return jsonify({"message": "Location deleted successfully"})
+    except Exception:
+        db.session.rollback()
+        logger.exception("Error in delete_location")
+        return jsonify({"error": "Internal server error"}), 500
+
+@bp.route("/api/share-location/<int:location_id>", methods=["GET"])
+def share_location(location_id):
+    try:
+        # Share links get hit in bursts, so serve recent payloads from memory
+        share_data = share_cache.lookup(location_id, None)
+        if share_data is not MISS:
+            with timing.phase("serialize"):
+                return jsonify(share_data)
+
+        # Get location data
+        location = Location.query.get_or_404(location_id)
+        
+        # Get current weather from API
+        weather_api_key = os.getenv('WEATHER_API_KEY')
+        current_weather = {}
+        risk_data = {}
+        # A payload degraded by a failed fetch is served but not cached
+        complete = not weather_api_key
+        
+        if weather_api_key:
+            try:
+                # One forecast payload carries the current conditions and feeds the risk
+                # assessment; the elevation lookup runs alongside it. A recent
+                # precomputed assessment makes the elevation lookup unnecessary.
+                precomputed = latest_assessment(location)
+                if precomputed:
+                    with timing.phase("weather"):
+                        weather_info = weather_api.get_forecast(location.latitude, location.longitude, weather_api_key)
+                else:
+                    weather_info, elevation = fetch_risk_inputs(
+                        location.latitude, location.longitude, location, weather_api_key
+                    )
+                current_weather = {
+                    "temp": weather_info.current.temp,
+                    "condition": weather_info.current.description,
+                    "humidity": weather_info.current.humidity,
+                    "wind_speed": weather_info.current.wind_speed
+                }
+                
+                # Get risk assessment
+                risk_data = precomputed or assess_flood_risk(
+                    location.latitude,
+                    location.longitude,
+                    location=location,
+                    weather_data=weather_info,
+                    elevation=elevation
+                )
+                complete = True
+            except Exception as e:
+                logger.warning("Error fetching current weather or risk data: %s", e)
+        
+        # Create shareable data
+        share_data = {
+            "location": {
+                "name": location.name,
+                "latitude": location.latitude,
+                "longitude": location.longitude,
+                "description": location.description
+            },
+            "weather": current_weather,
+            "risk": risk_data,
+            "timestamp": datetime.now().isoformat(),
+            "app_name": "GEO-Tagging System"
+        }
+        if complete:
+            share_cache.set(location_id, share_data)
+        
+        with timing.phase("serialize"):
+            return jsonify(share_data)
+        
+    except Exception:
+        logger.exception("Error in share_location")
+        return jsonify({"error": "Failed to generate share data"}), 500
+
+def admin_authorized():
+    """Whether the request carries ``Authorization: Bearer <ADMIN_TOKEN>`` (always true when unset)"""
+    admin_token = current_app.config.get("ADMIN_TOKEN")
+    return not admin_token or request.headers.get("Authorization") == f"Bearer {admin_token}"
+
+@bp.route("/api/admin/quota", methods=["GET"])
+def quota_status():
+    """
+    WeatherAPI budget: usage, remaining calls, burn rate and projected
+    exhaustion per period. Requires ADMIN_TOKEN when it is set.
+    """
+    if not admin_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    status = weather_api.quota.status()
+    status["forecast_cache"] = weather_api.forecast_cache.stats()
+    return jsonify(status)
+
+@bp.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus metrics (text exposition format); requires ADMIN_TOKEN when it is set"""
+    if not admin_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    return current_app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+def refresh_stale_locations(app, max_calls):
+    """
+    Refresh forecasts and risk for saved locations whose latest assessment
+    is missing or older than RISK_MAX_AGE: never-assessed locations first,
+    then HIGH before MEDIUM before LOW, oldest first within a level.
+    Locations in an already-cached forecast cell cost nothing; at most
+    ``max_calls`` other cells are fetched, and never more than the WeatherAPI
+    quota leaves for background traffic. New WeatherData and
+    RiskAssessment rows are written in one transaction.
+    Returns the number of upstream forecast calls made.
+    """
+    weather_api_key = os.getenv('WEATHER_API_KEY')
+    if not weather_api_key:
+        return 0
+    available = weather_api.quota.available(BACKGROUND)
+    if available is not None and available < max_calls:
+        logger.info("WeatherAPI quota allows %d background calls this cycle", available)
+        max_calls = available
+
+    with app.app_context():
+        cutoff = datetime.utcnow() - timedelta(seconds=app.config["RISK_MAX_AGE"])
+        latest = db.session.query(
+            RiskAssessment.location_id.label("location_id"),
+            func.max(RiskAssessment.id).label("id")
+        ).group_by(RiskAssessment.location_id).subquery()
+        risk_rank = case((RiskAssessment.risk_level == "HIGH", 2), (RiskAssessment.risk_level == "MEDIUM", 1), else_=0)
+        locations = (
+            Location.query
+            .outerjoin(latest, latest.c.location_id == Location.id)
+            .outerjoin(RiskAssessment, RiskAssessment.id == latest.c.id)
+            .filter(or_(RiskAssessment.id.is_(None), RiskAssessment.timestamp < cutoff))
+            .order_by(RiskAssessment.id.isnot(None), risk_rank.desc(), RiskAssessment.timestamp.asc())
+            .limit(app.config["REFRESH_BATCH_SIZE"])
+            .all()
+        )
+
+        items = {}
+        new_cells = set()
+        for location in locations:
+            cell = weather_api.forecast_key(location.latitude, location.longitude)
+            if cell not in new_cells and weather_api.forecast_cache.get(cell) is None:
+                if len(new_cells) >= max_calls:
+                    continue
+                new_cells.add(cell)
+            items[str(location.id)] = (location.latitude, location.longitude, location)
+
+        if items:
+            logger.info("Refreshing %d locations (%d upstream calls)", len(items), len(new_cells))
+            assess_locations(items, weather_api_key, record_weather=True, priority=BACKGROUND)
+        return len(new_cells)
+
+def prune_stale_history(app, budget=None):
+    """Apply the history retention policy (scheduler callback; makes no upstream calls)"""
+    with app.app_context():
+        removed = prune_history(app.config["HISTORY_RAW_RETENTION_DAYS"], app.config["HISTORY_HOURLY_RETENTION_DAYS"])
+        logger.info("Pruned history rows: %s", removed)
+    return 0
+
+def init_app(app, start_workers=True):
+    """
+    Configure the share cache and create the write-behind queue, the OSM
+    prefetch queue and the refresh/retention schedulers for ``app`` (and
+    report them in /metrics). The schedulers only run in-process when
+    ``start_workers`` is set and they are enabled.
+    """
+    global risk_writer, osm_prefetcher, refresh_scheduler, history_pruner
+    share_cache.configure(ttl=app.config["SHARE_CACHE_TTL"], max_entries=app.config["SHARE_CACHE_MAX_ENTRIES"])
+
+    # Group-commits per-request RiskAssessment inserts from predict/share
+    risk_writer = WriteBehindQueue(
+        partial(write_risk_records, app),
+        interval=app.config["RISK_WRITE_INTERVAL"],
+        max_batch=app.config["RISK_WRITE_BATCH"],
+        name="risk-writer"
+    )
+    # Fetches drainage context for created/imported locations off the request path
+    osm_prefetcher = WriteBehindQueue(
+        prefetch_osm_context, interval=1.0, max_batch=100, name="osm-prefetch", drain_at_exit=False
+    )
+    refresh_scheduler = RefreshScheduler(
+        partial(refresh_stale_locations, app),
+        interval=app.config["REFRESH_INTERVAL"],
+        rate_per_minute=app.config["REFRESH_RATE_PER_MINUTE"]
+    )
+    history_pruner = RefreshScheduler(
+        partial(prune_stale_history, app),
+        interval=app.config["HISTORY_PRUNE_INTERVAL"],
+        rate_per_minute=1,
+        name="history-pruner"
+    )
+    metrics.register_cache("share", share_cache.stats)
+    metrics.register("write_behind", partial(write_behind.collect, [risk_writer, osm_prefetcher]))
+    if start_workers and app.config["REFRESH_ENABLED"]:
+        refresh_scheduler.start()
+    if start_workers and app.config["HISTORY_PRUNE_INTERVAL"] > 0:
+        history_pruner.start()
+
+@bp.cli.command("refresh-worker")
+def refresh_worker():
+    """Run the location refresh scheduler in the foreground as a separate worker"""
+    refresh_scheduler.run_forever()
+
+@bp.cli.command("prune-history")
+def prune_history_command():
+    """Apply the history retention policy once"""
+    prune_stale_history(current_app._get_current_object())
+
+@bp.cli.command("osm-prefetch")
+def osm_prefetch_command():
+    """Fetch the OSM drainage context of every saved location that lacks it"""
+    fetched = 0
+    for location in Location.query.options(load_only(Location.latitude, Location.longitude)).yield_per(500):
+        try:
+            fetched += osm_context.prefetch(location.latitude, location.longitude)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning("Error fetching OSM context for location %d: %s", location.id, e)
+    logger.info("Fetched %d OSM tiles", fetched)
@@ -0,0 +1,125 @@
+"""
+Async (httpx) execution path for upstream API calls.
+
+A single event loop runs in a daemon thread for the life of the process and
+owns one pooled httpx.AsyncClient. Sync Flask views hand coroutines to it
+with ``run``/``gather`` so independent upstream calls (forecast, elevation)
+are in flight at the same time. Timeouts, retries, circuit breakers and
+metrics are shared with the sync client in app.utils.upstream.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.utils import upstream
+from app.utils.upstream import RETRY_METHODS, RETRY_STATUSES, CircuitOpenError
+
+_loop = None
+_client = None
+_lock = threading.Lock()
+
+
+def _start_loop():
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="upstream-event-loop", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def _get_client():
+    # Only ever called on the managed loop, so no locking needed
+    global _client
+    if _client is None:
+        settings = upstream.client
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.read_timeout, connect=settings.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=settings.pool_size * 4,
+                max_keepalive_connections=settings.pool_size
+            )
+        )
+    return _client
+
+
+async def _in_context(coro, context):
+    # Tasks on the loop start from the loop thread's context; carry over the
+    # caller's context variables (e.g. the request id used in log records)
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+def run(coro, timeout=None):
+    """
+    Run ``coro`` on the managed event loop, in a copy of the caller's
+    context, and block until it finishes
+    """
+    loop = _start_loop()
+    return asyncio.run_coroutine_threadsafe(_in_context(coro, contextvars.copy_context()), loop).result(timeout)
+
+
+def gather(*coros, return_exceptions=False, timeout=None):
+    """
+    Run several coroutines concurrently on the managed loop and return their
+    results in order
+    """
+    async def _gather():
+        return await asyncio.gather(*coros, return_exceptions=return_exceptions)
+    return run(_gather(), timeout)
+
+
+async def request(method, url, params=None, timeout=None):
+    """
+    Async counterpart of upstream.UpstreamClient.request, returning an
+    httpx.Response. Transport failures raise httpx.TransportError and open
+    circuits raise CircuitOpenError.
+    """
+    settings = upstream.client
+    host = urlsplit(url).netloc
+    breaker, metrics = settings.guards(host)
+    if not breaker.allow():
+        metrics.count('short_circuited')
+        raise CircuitOpenError(f"Circuit open for {host}")
+
+    client = _get_client()
+    if timeout is not None:
+        timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+    else:
+        timeout = httpx.USE_CLIENT_DEFAULT
+    attempts = settings.retries + 1 if method.upper() in RETRY_METHODS else 1
+    for attempt in range(attempts):
+        last_attempt = attempt == attempts - 1
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, params=params, timeout=timeout)
+        except httpx.TransportError:
+            metrics.observe(time.perf_counter() - started, error=True)
+            if last_attempt:
+                breaker.record_failure()
+                raise
+            metrics.count('retries')
+            await asyncio.sleep(settings.retry_delay(attempt))
+            continue
+
+        failed = response.status_code in RETRY_STATUSES
+        metrics.observe(time.perf_counter() - started, error=failed)
+        if failed and not last_attempt:
+            metrics.count('retries')
+            await asyncio.sleep(settings.retry_delay(attempt, response.headers.get("Retry-After")))
+            continue
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+
+async def get(url, **kwargs):
+    return await request("GET", url, **kwargs)
@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Sentinel returned by TTLCache.lookup when there is no usable entry
+MISS = object()
+
+
+def snap_coordinates(lat, lng, grid):
+    """
+    Snap a coordinate pair onto a regular grid of ``grid`` degrees so that
+    nearby points share a cache key
+    """
+    lat = round(round(float(lat) / grid) * grid, 6)
+    lng = round(round(float(lng) / grid) * grid, 6)
+    return lat, lng
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry TTL and stale-while-revalidate.
+
+    Entries younger than ``ttl`` seconds are served as fresh. Entries older
+    than ``ttl`` but younger than ``ttl + stale_ttl`` are served immediately
+    while a background thread refreshes them. Anything older is a miss, but
+    stays in the cache (until evicted or replaced) so ``peek`` can still
+    serve it as a last resort.
+    """
+
+    def __init__(self, ttl=600, stale_ttl=0, max_entries=1024):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, ttl=None, stale_ttl=None, max_entries=None):
+        with self._lock:
+            if ttl is not None:
+                self.ttl = ttl
+            if stale_ttl is not None:
+                self.stale_ttl = stale_ttl
+            if max_entries is not None:
+                self.max_entries = max_entries
+                self._evict()
+
+    def get(self, key):
+        """Return a fresh value for ``key`` or None, without fetching"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[1] >= self.ttl:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def peek(self, key, max_age=None):
+        """
+        Return the value stored for ``key`` whatever its age (or no older
+        than ``max_age`` seconds), or MISS; never refreshes
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (max_age is not None and time.monotonic() - entry[1] >= max_age):
+                return MISS
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def lookup(self, key, fetch):
+        """
+        Return the cached value for ``key`` or MISS, without fetching on a
+        miss. A stale hit is returned as-is and refreshed in the background
+        with ``fetch()``.
+        """
+        refresh = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = time.monotonic() - stored_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        refresh = True
+                else:
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return MISS
+
+        if refresh:
+            threading.Thread(target=self._refresh, args=(key, fetch), daemon=True).start()
+        return value
+
+    def get_or_fetch(self, key, fetch):
+        """
+        Return the cached value for ``key``, calling ``fetch()`` on a miss.
+        Exceptions raised by ``fetch`` propagate and nothing is cached.
+        """
+        value = self.lookup(key, fetch)
+        if value is MISS:
+            value = fetch()
+            self.set(key, value)
+        return value
+
+    async def get_or_fetch_async(self, key, fetch, fetch_async):
+        """
+        Async variant of get_or_fetch: misses await ``fetch_async()``, while
+        background stale refreshes still use the sync ``fetch()``
+        """
+        value = self.lookup(key, fetch)
+        if value is MISS:
+            value = await fetch_async()
+            self.set(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+            }
+
+    def _refresh(self, key, fetch):
+        try:
+            self.set(key, fetch())
+        except Exception as e:
+            logger.warning("Background cache refresh failed for %s: %s", key, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
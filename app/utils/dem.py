@@ -0,0 +1,199 @@
+"""
+Local cache of SRTM elevation tiles.
+
+Tiles are 1 x 1 degree HGT grids (big-endian int16, (n x n) samples with
+shared edges), downloaded once into a cache directory and then opened as
+read-only memory maps, so only the pages that are actually sampled are read
+from disk. Open tiles are kept in a small LRU. Lookups are vectorized in
+NumPy with bilinear interpolation between the four surrounding samples.
+
+app.utils.elevation_store samples these tiles for points missing from its
+point cache and only falls back to the remote elevation API for points the
+tiles cannot answer.
+"""
+import gzip
+import logging
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+import requests
+
+from app.utils import upstream
+from app.utils.singleflight import flights
+
+logger = logging.getLogger(__name__)
+
+# Public SRTM tiles in HGT format (AWS terrain tiles "skadi" layout)
+DEM_TILE_URL = "https://s3.amazonaws.com/elevation-tiles-prod/skadi/{lat_band}/{name}.hgt.gz"
+HGT_VOID = -32768
+# A tile that fails to download or decompress raises one of these
+TILE_ERRORS = (requests.exceptions.RequestException, OSError, EOFError, zlib.error)
+
+
+def tile_name(lat_floor, lng_floor):
+    """HGT tile name for the tile whose south-west corner is (lat_floor, lng_floor), e.g. N14E120"""
+    return "%s%02d%s%03d" % (
+        "N" if lat_floor >= 0 else "S", abs(lat_floor),
+        "E" if lng_floor >= 0 else "W", abs(lng_floor)
+    )
+
+
+class DEMTileCache:
+    """
+    Disk cache plus LRU of memory-mapped SRTM tiles.
+
+    Tiles are written to a temporary file and renamed into place, so
+    concurrent requests never see a partial tile. Tiles the source does not
+    have (open ocean) are remembered with an empty marker file and sample as
+    sea level. Tiles that fail to download are not retried for
+    ``retry_after`` seconds.
+    """
+
+    def __init__(self, directory=None, url=DEM_TILE_URL, max_open=16, retry_after=300):
+        self.directory = directory
+        self.url = url
+        self.max_open = max_open
+        self.retry_after = retry_after
+        self._open = OrderedDict()
+        self._failed = {}  # tile name -> monotonic time of the last failed download
+        self._lock = threading.Lock()
+
+    def configure(self, directory=None, url=None, max_open=None, retry_after=None):
+        with self._lock:
+            if directory is not None:
+                self.directory = directory
+                os.makedirs(directory, exist_ok=True)
+            if url is not None:
+                self.url = url
+            if max_open is not None:
+                self.max_open = max_open
+            if retry_after is not None:
+                self.retry_after = retry_after
+            self._open.clear()
+            self._failed.clear()
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.hgt")
+
+    def _download(self, name, path):
+        if os.path.exists(path) or os.path.exists(path + ".missing"):
+            return  # downloaded since the caller looked
+        logger.info("Downloading DEM tile %s", name)
+        lat_band = name[:3]
+        with upstream.get(self.url.format(lat_band=lat_band, name=name), stream=True) as response:
+            if response.status_code in (403, 404):
+                open(path + ".missing", "w").close()
+                return
+            response.raise_for_status()
+            descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+            try:
+                with os.fdopen(descriptor, "wb") as out:
+                    source = response.raw
+                    if self.url.endswith(".gz"):
+                        source = gzip.GzipFile(fileobj=source)
+                    shutil.copyfileobj(source, out, 1024 * 1024)
+                os.replace(temp_path, path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def _load(self, name):
+        path = self._path(name)
+        if not os.path.exists(path) and not os.path.exists(path + ".missing"):
+            flights.do(("dem", name), lambda: self._download(name, path))
+        if not os.path.exists(path):
+            return None
+        size = int(math.isqrt(os.path.getsize(path) // 2))
+        return np.memmap(path, dtype=">i2", mode="r", shape=(size, size))
+
+    def tile(self, name):
+        """
+        Return the memory-mapped grid for a tile, or None for a tile without
+        data. Raises one of TILE_ERRORS if the tile cannot be downloaded.
+        """
+        with self._lock:
+            if name in self._open:
+                self._open.move_to_end(name)
+                return self._open[name]
+            failed_at = self._failed.get(name)
+        if failed_at is not None and time.monotonic() - failed_at < self.retry_after:
+            raise requests.exceptions.ConnectionError(f"DEM tile {name} recently failed to download")
+        try:
+            grid = self._load(name)
+        except TILE_ERRORS:
+            with self._lock:
+                self._failed[name] = time.monotonic()
+            raise
+        with self._lock:
+            self._open[name] = grid
+            self._open.move_to_end(name)
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        return grid
+
+    def sample(self, lats, lngs):
+        """
+        Bilinearly interpolated elevations (metres) for arrays of points.
+        Points on void samples or on tiles that cannot be downloaded come
+        back as NaN.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        result = np.zeros(lats.shape)
+        lat_floors = np.floor(lats).astype(int)
+        lng_floors = np.floor(lngs).astype(int)
+        for lat_floor, lng_floor in set(zip(lat_floors.tolist(), lng_floors.tolist())):
+            mask = (lat_floors == lat_floor) & (lng_floors == lng_floor)
+            name = tile_name(lat_floor, lng_floor)
+            try:
+                grid = self.tile(name)
+            except TILE_ERRORS as e:
+                logger.warning("DEM tile %s unavailable: %s", name, e)
+                result[mask] = np.nan
+                continue
+            if grid is None:
+                continue  # no land in this tile: sea level
+            last = grid.shape[0] - 1
+            # Row 0 is the northern edge of the tile
+            rows = (lat_floor + 1 - lats[mask]) * last
+            cols = (lngs[mask] - lng_floor) * last
+            r0 = np.clip(np.floor(rows).astype(int), 0, last - 1)
+            c0 = np.clip(np.floor(cols).astype(int), 0, last - 1)
+            dr = rows - r0
+            dc = cols - c0
+            corners = [grid[r0, c0], grid[r0, c0 + 1], grid[r0 + 1, c0], grid[r0 + 1, c0 + 1]]
+            top_left, top_right, bottom_left, bottom_right = (
+                np.where(corner == HGT_VOID, np.nan, corner.astype(float)) for corner in corners
+            )
+            result[mask] = (
+                top_left * (1 - dr) * (1 - dc) + top_right * (1 - dr) * dc +
+                bottom_left * dr * (1 - dc) + bottom_right * dr * dc
+            )
+        return result
+
+    def elevation(self, lat, lng):
+        return float(self.sample([lat], [lng])[0])
+
+
+tiles = DEMTileCache()
+
+
+def init_app(app):
+    """
+    Point the tile cache at DEM_CACHE_DIR (defaults to the app instance
+    folder) and apply the DEM_* settings
+    """
+    directory = app.config.get('DEM_CACHE_DIR') or os.path.join(app.instance_path, 'dem_tiles')
+    tiles.configure(
+        directory=directory,
+        url=app.config.get('DEM_TILE_URL') or DEM_TILE_URL,
+        max_open=app.config.get('DEM_MAX_OPEN_TILES'),
+        retry_after=app.config.get('DEM_RETRY_AFTER')
+    )
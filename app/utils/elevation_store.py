@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import httpx
+import numpy as np
+import requests
+from app.utils import upstream, async_upstream, dem
+from app.utils.singleflight import flights
+
+logger = logging.getLogger(__name__)
+
+OPEN_METEO_ELEVATION_URL = "https://api.open-meteo.com/v1/elevation"
+MAX_POINTS_PER_REQUEST = 100  # open-meteo limit for one elevation call
+
+
+class ElevationStore:
+    """
+    Persistent point cache of elevations in a local SQLite file.
+
+    Points are keyed by coordinates quantized to ``precision`` decimal
+    places (4 places is roughly 11 m), which is finer than the ~90 m DEM
+    behind the upstream API. Elevation never changes, so entries never expire.
+    """
+
+    def __init__(self, path=None, precision=4):
+        self.path = path
+        self.precision = precision
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def open(self, path, precision=None):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            if precision is not None:
+                self.precision = precision
+            self.path = path
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS elevation_points ("
+                "lat_key INTEGER NOT NULL, lng_key INTEGER NOT NULL, elevation REAL NOT NULL, "
+                "PRIMARY KEY (lat_key, lng_key)) WITHOUT ROWID"
+            )
+            self._conn.commit()
+
+    def key(self, lat, lng):
+        scale = 10 ** self.precision
+        return int(round(float(lat) * scale)), int(round(float(lng) * scale))
+
+    def get_many(self, keys):
+        """Return {key: elevation} for the keys present in the store"""
+        if self._conn is None or not keys:
+            return {}
+        found = {}
+        keys = list(set(keys))
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 400):
+                chunk = keys[start:start + 400]
+                clause = " OR ".join(["(lat_key = ? AND lng_key = ?)"] * len(chunk))
+                params = [part for key in chunk for part in key]
+                rows = self._conn.execute(
+                    f"SELECT lat_key, lng_key, elevation FROM elevation_points WHERE {clause}", params
+                )
+                for lat_key, lng_key, elevation in rows:
+                    found[(lat_key, lng_key)] = elevation
+        return found
+
+    def put_many(self, values):
+        """Store a {key: elevation} mapping"""
+        if self._conn is None or not values:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO elevation_points (lat_key, lng_key, elevation) VALUES (?, ?, ?)",
+                [(key[0], key[1], elevation) for key, elevation in values.items()]
+            )
+            self._conn.commit()
+
+
+store = ElevationStore()
+elevation_url = OPEN_METEO_ELEVATION_URL
+
+
+def init_app(app):
+    """
+    Open the on-disk elevation store (defaults to the app instance folder)
+    and apply the elevation API URL
+    """
+    global elevation_url
+    elevation_url = app.config.get('ELEVATION_API_URL') or OPEN_METEO_ELEVATION_URL
+    path = app.config.get('ELEVATION_CACHE_PATH')
+    if not path:
+        os.makedirs(app.instance_path, exist_ok=True)
+        path = os.path.join(app.instance_path, 'elevation_cache.db')
+    store.open(path, precision=app.config.get('ELEVATION_CACHE_PRECISION'))
+
+
+def _elevation_params(chunk):
+    return {
+        "latitude": ",".join(str(lat) for lat, _ in chunk),
+        "longitude": ",".join(str(lng) for _, lng in chunk)
+    }
+
+
+def fetch_elevations(points):
+    """
+    Fetch elevations for a list of (lat, lng) points from open-meteo,
+    batching up to MAX_POINTS_PER_REQUEST points per call
+    """
+    elevations = []
+    for start in range(0, len(points), MAX_POINTS_PER_REQUEST):
+        chunk = points[start:start + MAX_POINTS_PER_REQUEST]
+        response = upstream.get(elevation_url, params=_elevation_params(chunk))
+        response.raise_for_status()
+        elevations.extend(response.json().get("elevation", []))
+    return elevations
+
+
+async def fetch_elevations_async(points):
+    """
+    Async counterpart of fetch_elevations; chunks are requested concurrently
+    """
+    chunks = [points[start:start + MAX_POINTS_PER_REQUEST] for start in range(0, len(points), MAX_POINTS_PER_REQUEST)]
+    responses = await asyncio.gather(*[
+        async_upstream.get(elevation_url, params=_elevation_params(chunk)) for chunk in chunks
+    ])
+    elevations = []
+    for response in responses:
+        response.raise_for_status()
+        elevations.extend(response.json().get("elevation", []))
+    return elevations
+
+
+def _resolve_locally(points, known):
+    # Stored values first, then the on-disk store; returns the partial
+    # results, each point's store key and the distinct keys still missing
+    known = known or [None] * len(points)
+    results = list(known)
+
+    keys = [store.key(lat, lng) for lat, lng in points]
+    pending = [i for i, value in enumerate(results) if value is None]
+    cached = store.get_many([keys[i] for i in pending])
+    for i in pending:
+        results[i] = cached.get(keys[i])
+
+    missing = {}
+    for i, value in enumerate(results):
+        if value is None:
+            missing.setdefault(keys[i], points[i])
+    # Sorted so identical misses from concurrent requests share one call
+    return results, keys, dict(sorted(missing.items()))
+
+
+def _sample_tiles(results, keys, missing):
+    # Fill misses from the local DEM tiles (downloading a tile the first
+    # time it is needed); returns the misses the tiles could not answer
+    if not missing:
+        return missing
+    lats, lngs = zip(*missing.values())
+    sampled = dem.tiles.sample(lats, lngs)
+    found = {key: float(value) for key, value in zip(missing, sampled) if not np.isnan(value)}
+    store.put_many(found)
+    for i, value in enumerate(results):
+        if value is None:
+            results[i] = found.get(keys[i])
+    return {key: point for key, point in missing.items() if key not in found}
+
+
+def _resolve_offline(points, known):
+    # Everything short of the remote API: stored values, the point cache, DEM tiles
+    results, keys, missing = _resolve_locally(points, known)
+    return results, keys, _sample_tiles(results, keys, missing)
+
+
+def _flight_key(missing):
+    return ("elevation",) + tuple(missing)
+
+
+def _merge_fetched(results, keys, missing, fetched):
+    fetched = {key: float(value) for key, value in zip(missing, fetched) if value is not None}
+    store.put_many(fetched)
+    for i, value in enumerate(results):
+        if value is None:
+            results[i] = fetched.get(keys[i])
+    return results
+
+
+def resolve_elevations(points, known=None):
+    """
+    Resolve elevations for a list of (lat, lng) points.
+
+    ``known`` is an optional parallel list of stored ``Location.elevation``
+    values; None counts as unknown. Unknown points are looked up in the
+    on-disk store, then sampled from the local DEM tiles (app.utils.dem), and
+    only points neither can answer go to the remote API, in one batched
+    round-trip shared with any identical lookup already in flight. Points
+    that cannot be resolved come back as None.
+    """
+    results, keys, missing = _resolve_offline(points, known)
+    if missing:
+        try:
+            fetched = flights.do(_flight_key(missing), lambda: fetch_elevations(list(missing.values())))
+            results = _merge_fetched(results, keys, missing, fetched)
+        except (requests.exceptions.RequestException, ValueError, TypeError) as e:
+            logger.warning("Error fetching elevation data: %s", e)
+    return results
+
+
+async def resolve_elevations_async(points, known=None):
+    """
+    Async counterpart of resolve_elevations, for use on the managed event
+    loop. The point cache and DEM tiles are disk I/O (and a tile may have to
+    be downloaded), so they are read and written in worker threads; only
+    the remote API call runs on the loop.
+    """
+    if known and all(value is not None for value in known):
+        return list(known)
+    results, keys, missing = await asyncio.to_thread(_resolve_offline, points, known)
+    if missing:
+        try:
+            fetched = await flights.do_async(
+                _flight_key(missing), lambda: fetch_elevations_async(list(missing.values()))
+            )
+            results = await asyncio.to_thread(_merge_fetched, results, keys, missing, fetched)
+        except (httpx.HTTPError, requests.exceptions.RequestException, ValueError, TypeError) as e:
+            logger.warning("Error fetching elevation data: %s", e)
+    return results
+
+
+def resolve_elevation(lat, lng, known=None):
+    """Single-point convenience wrapper around resolve_elevations"""
+    return resolve_elevations([(lat, lng)], [known])[0]
+
+
+async def resolve_elevation_async(lat, lng, known=None):
+    """Single-point convenience wrapper around resolve_elevations_async"""
+    return (await resolve_elevations_async([(lat, lng)], [known]))[0]
@@ -0,0 +1,152 @@
+"""
+Streaming writers for bulk location exports.
+
+Each writer takes an iterable of row batches (lists of dicts keyed by
+column name) and yields encoded chunks, one per batch, so a response can
+start before the query finishes and memory stays bounded by the batch size.
+Parquet output needs the optional ``pyarrow`` package.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional: only needed for format=parquet
+    pyarrow = None
+
+# Export column -> value kind, in output order
+BASE_COLUMNS = {
+    "id": "int",
+    "name": "str",
+    "description": "str",
+    "latitude": "float",
+    "longitude": "float",
+    "elevation": "float",
+    "created_at": "datetime",
+    "updated_at": "datetime"
+}
+RISK_COLUMNS = {
+    "risk_level": "str",
+    "risk_assessed_at": "datetime"
+}
+WEATHER_COLUMNS = {
+    "rainfall": "float",
+    "water_level": "float",
+    "temperature": "float",
+    "humidity": "float",
+    "wind_speed": "float",
+    "weather_observed_at": "datetime"
+}
+EXPORT_FORMATS = {
+    "geojson": ("application/geo+json", "geojson"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet")
+}
+
+
+def _plain(row):
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+
+
+def write_ndjson(batches, columns):
+    for batch in batches:
+        yield "".join(json.dumps(_plain(row)) + "\n" for row in batch)
+
+
+def write_csv(batches, columns):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(columns))
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(_plain(row) for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _feature(row):
+    properties = _plain(row)
+    lng, lat = properties.pop("longitude"), properties.pop("latitude")
+    return json.dumps({
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lng, lat]},
+        "properties": properties
+    })
+
+
+def write_geojson(batches, columns):
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ""
+    for batch in batches:
+        if batch:
+            yield separator + ",".join(_feature(row) for row in batch)
+            separator = ","
+    yield "]}"
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def write_parquet(batches, columns):
+    """One Parquet row group per batch, streamed as it is written"""
+    if pyarrow is None:
+        raise RuntimeError("Parquet export requires the pyarrow package")
+    types = {"int": pyarrow.int64(), "float": pyarrow.float64(), "str": pyarrow.string(),
+             "datetime": pyarrow.timestamp("us")}
+    schema = pyarrow.schema([(name, types[kind]) for name, kind in columns.items()])
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    for batch in batches:
+        if batch:
+            writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+WRITERS = {"geojson": write_geojson, "ndjson": write_ndjson, "csv": write_csv, "parquet": write_parquet}
+
+
+def export_columns(include_risk=False, include_weather=False):
+    columns = dict(BASE_COLUMNS)
+    if include_risk:
+        columns.update(RISK_COLUMNS)
+    if include_weather:
+        columns.update(WEATHER_COLUMNS)
+    return columns
+
+
+def available(fmt):
+    return fmt != "parquet" or pyarrow is not None
@@ -0,0 +1,110 @@
+"""
+Compact parsed WeatherAPI forecasts.
+
+A forecast.json payload is a deeply nested dict (tens of kilobytes once
+decoded, mostly hourly detail nobody reads). ``parse_forecast`` walks it
+once and keeps only the fields the app uses: current conditions as a
+slotted object and per-day / per-hour values as fixed NumPy arrays. The
+forecast cache stores these, and the scorer reads the arrays directly.
+
+Rainfall and humidity follow the scorer's rules (missing or unparseable
+values are 0); other missing numbers are NaN in the arrays and None in the
+plain-Python views.
+"""
+import math
+
+import numpy as np
+
+from app.utils.risk_engine import to_float
+
+# Hourly columns, in order, as WeatherAPI names them
+HOURLY_FIELDS = ("precip_mm", "humidity", "temp_c", "wind_kph")
+
+
+def _optional(value):
+    return None if value is None or math.isnan(value) else value
+
+
+def _readonly(values, dtype=np.float64):
+    array = np.array(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+
+class Conditions:
+    """Current conditions from a forecast payload"""
+    __slots__ = ("temp", "humidity", "wind_speed", "precipitation", "description", "icon")
+
+    def __init__(self, current):
+        condition = current.get("condition") or {}
+        self.temp = to_float(current.get("temp_c"), None)
+        self.humidity = to_float(current.get("humidity"), None)
+        self.wind_speed = to_float(current.get("wind_kph"), None)
+        self.precipitation = to_float(current.get("precip_mm"))
+        self.description = condition.get("text")
+        self.icon = condition.get("icon")
+
+
+class Forecast:
+    """
+    Parsed forecast: ``current`` conditions plus per-day arrays (``precip``,
+    ``humidity``, ``temp``, ``wind``) aligned with ``dates`` and, when the
+    payload has hourly detail, an (hours, len(HOURLY_FIELDS)) float32
+    ``hourly`` array aligned with ``hourly_epochs``. Instances are shared
+    through the forecast cache; the arrays are read-only.
+    """
+    __slots__ = (
+        "current", "dates", "precip", "humidity", "temp", "wind",
+        "descriptions", "icons", "hourly_epochs", "hourly"
+    )
+
+    def __init__(self, payload):
+        self.current = Conditions(payload.get("current") or {})
+        days = (payload.get("forecast") or {}).get("forecastday") or []
+        day_values = [day.get("day") or {} for day in days]
+        self.dates = tuple(day.get("date") for day in days)
+        self.precip = _readonly([to_float(day.get("totalprecip_mm")) for day in day_values])
+        self.humidity = _readonly([to_float(day.get("avghumidity")) for day in day_values])
+        self.temp = _readonly([to_float(day.get("avgtemp_c"), np.nan) for day in day_values])
+        self.wind = _readonly([to_float(day.get("maxwind_kph"), np.nan) for day in day_values])
+        self.descriptions = tuple((day.get("condition") or {}).get("text") for day in day_values)
+        self.icons = tuple((day.get("condition") or {}).get("icon") for day in day_values)
+
+        hours = [hour for day in days for hour in day.get("hour") or []]
+        self.hourly_epochs = _readonly([hour.get("time_epoch") or 0 for hour in hours], np.int64)
+        self.hourly = _readonly(
+            [[to_float(hour.get(field), np.nan) for field in HOURLY_FIELDS] for hour in hours], np.float32
+        ).reshape(len(hours), len(HOURLY_FIELDS))
+
+    @property
+    def day_count(self):
+        return len(self.dates)
+
+    def days(self):
+        """Per-day values as plain dicts (for JSON responses)"""
+        return [
+            {
+                "date": date,
+                "temp": _optional(temp),
+                "weather_description": description,
+                "weather_icon": icon,
+                "humidity": humidity,
+                "wind_speed": _optional(wind),
+                "precipitation": precip
+            }
+            for date, temp, description, icon, humidity, wind, precip in zip(
+                self.dates, self.temp.tolist(), self.descriptions, self.icons,
+                self.humidity.tolist(), self.wind.tolist(), self.precip.tolist()
+            )
+        ]
+
+    def __repr__(self):
+        return (
+            f"<Forecast {self.day_count} days, {len(self.hourly)} hours, "
+            f"current precip {self.current.precipitation} mm, daily precip {self.precip.tolist()}>"
+        )
+
+
+def parse_forecast(payload):
+    """Parse a WeatherAPI forecast.json payload into a Forecast"""
+    return Forecast(payload)
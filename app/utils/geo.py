@@ -0,0 +1,121 @@
+import math
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+# Sorts after every geohash character, so [prefix, prefix + "{") is a range scan
+PREFIX_UPPER_BOUND = "{"
+
+
+def geohash_encode(lat, lng, precision=GEOHASH_PRECISION):
+    """
+    Encode a coordinate as a geohash string of ``precision`` characters
+    """
+    lat, lng = float(lat), float(lng)
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, bounds = (lng, lng_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            bounds[0] = mid
+        else:
+            bits <<= 1
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """Return the (lat, lng) size in degrees of a geohash cell"""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = (5 * precision) // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def _cell_ranges(min_lat, min_lng, max_lat, max_lng, precision):
+    lat_size, lng_size = cell_size(precision)
+    lat_cells = range(int((min_lat + 90) // lat_size), int((max_lat + 90) // lat_size) + 1)
+    lng_cells = range(int((min_lng + 180) // lng_size), int((max_lng + 180) // lng_size) + 1)
+    return lat_cells, lng_cells, lat_size, lng_size
+
+
+def covering_cells(min_lat, min_lng, max_lat, max_lng, max_cells=16):
+    """
+    Return geohash prefixes whose cells together cover the bounding box,
+    using the finest precision that needs at most ``max_cells`` cells.
+    A box with min_lng > max_lng crosses the antimeridian.
+    """
+    if min_lng > max_lng:
+        return (covering_cells(min_lat, min_lng, max_lat, 180.0, max_cells // 2 or 1) +
+                covering_cells(min_lat, -180.0, max_lat, max_lng, max_cells // 2 or 1))
+
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    min_lng, max_lng = max(min_lng, -180.0), min(max_lng, 180.0)
+    best = 0
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        lat_cells, lng_cells, _, _ = _cell_ranges(min_lat, min_lng, max_lat, max_lng, precision)
+        if len(lat_cells) * len(lng_cells) > max_cells:
+            break
+        best = precision
+    if best == 0:
+        return [""]  # Box too large to be worth indexing: scan everything
+
+    lat_cells, lng_cells, lat_size, lng_size = _cell_ranges(min_lat, min_lng, max_lat, max_lng, best)
+    cells = set()
+    for i in lat_cells:
+        for j in lng_cells:
+            center_lat = min(-90 + (i + 0.5) * lat_size, 90.0)
+            center_lng = min(-180 + (j + 0.5) * lng_size, 180.0)
+            cells.add(geohash_encode(center_lat, center_lng, best))
+    return sorted(cells)
+
+
+def bbox_around(lat, lng, radius_km):
+    """
+    Return (min_lat, min_lng, max_lat, max_lng) enclosing a circle; the
+    longitude span may wrap (min_lng > max_lng) across the antimeridian
+    """
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = lat - lat_delta, lat + lat_delta
+    if min_lat <= -90 or max_lat >= 90:
+        # The circle contains a pole: every longitude is in range
+        return max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0
+    # Widest longitude extent of the circle (reached poleward of its centre)
+    ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat))
+    if ratio >= 1:
+        return min_lat, -180.0, max_lat, 180.0
+    lng_delta = math.degrees(math.asin(ratio))
+    min_lng, max_lng = lng - lng_delta, lng + lng_delta
+    if min_lng < -180:
+        min_lng += 360
+    if max_lng > 180:
+        max_lng -= 360
+    return min_lat, min_lng, max_lat, max_lng
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def in_bbox(lat, lng, min_lat, min_lng, max_lat, max_lng):
+    if not min_lat <= lat <= max_lat:
+        return False
+    if min_lng <= max_lng:
+        return min_lng <= lng <= max_lng
+    return lng >= min_lng or lng <= max_lng
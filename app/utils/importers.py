@@ -0,0 +1,210 @@
+"""
+Streaming parsers for bulk location imports.
+
+Each parser reads a binary stream incrementally and yields
+``(row_number, fields)`` pairs, where ``fields`` is a dict of raw values or
+a ValueError describing why the row could not be read. Nothing holds more
+than one row (or one GeoJSON feature) in memory at a time.
+"""
+import codecs
+import csv
+import io
+import json
+import math
+
+IMPORT_FORMATS = ("csv", "geojson", "ndjson")
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/geo+json": "geojson",
+    "application/json": "geojson",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson"
+}
+LATITUDE_KEYS = ("latitude", "lat")
+LONGITUDE_KEYS = ("longitude", "lng", "lon")
+CHUNK_SIZE = 64 * 1024
+
+
+def detect_format(explicit, content_type):
+    """Pick the import format from ``?format=`` or the request content type"""
+    if explicit:
+        if explicit not in IMPORT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(IMPORT_FORMATS)}")
+        return explicit
+    fmt = CONTENT_TYPES.get((content_type or "").split(";")[0].strip().lower())
+    if fmt is None:
+        raise ValueError("Unsupported content type; pass ?format=csv|geojson|ndjson")
+    return fmt
+
+
+def _first(data, keys):
+    for key in keys:
+        value = data.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _number(value, name, low=None, high=None):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+    if not math.isfinite(number) or (low is not None and not low <= number <= high):
+        raise ValueError(f"{name} must be between {low} and {high}" if low is not None else f"{name} must be finite")
+    return number
+
+
+def normalize_row(data):
+    """
+    Validate raw row fields and return Location column values (elevation is
+    None when the row does not supply one)
+    """
+    if not isinstance(data, dict):
+        raise ValueError("row must be an object")
+    latitude = _first(data, LATITUDE_KEYS)
+    longitude = _first(data, LONGITUDE_KEYS)
+    if latitude is None or longitude is None:
+        raise ValueError("latitude and longitude are required")
+    elevation = data.get("elevation")
+    return {
+        "name": str(data.get("name") or "Unknown Location")[:100],
+        "latitude": _number(latitude, "latitude", -90, 90),
+        "longitude": _number(longitude, "longitude", -180, 180),
+        "description": str(data.get("description") or ""),
+        "elevation": _number(elevation, "elevation") if elevation not in (None, "") else None
+    }
+
+
+def read_csv(stream):
+    reader = csv.DictReader(io.TextIOWrapper(io.BufferedReader(stream), encoding="utf-8-sig", newline=""))
+    try:
+        for row_number, row in enumerate(reader, start=1):
+            yield row_number, {key.strip().lower(): value for key, value in row.items() if key}
+    except (csv.Error, UnicodeDecodeError) as e:
+        yield reader.line_num, ValueError(f"Unreadable CSV: {str(e)}")
+
+
+def read_ndjson(stream):
+    row_number = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            yield row_number, json.loads(line)
+        except ValueError as e:
+            yield row_number, ValueError(f"Invalid JSON: {str(e)}")
+
+
+class _JSONReader:
+    """Incremental reader that decodes one JSON value at a time from a stream"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.json = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.stream.read(CHUNK_SIZE)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it ('' at end)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Invalid GeoJSON: expected '{char}'")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buffer, self.pos)
+                # A number running to the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise ValueError("Invalid GeoJSON: malformed value")
+            self._fill()
+
+
+def _feature_fields(feature):
+    if not isinstance(feature, dict) or feature.get("type") != "Feature":
+        raise ValueError("not a GeoJSON Feature")
+    geometry = feature.get("geometry") or {}
+    if geometry.get("type") != "Point":
+        raise ValueError("geometry must be a Point")
+    coordinates = geometry.get("coordinates") or []
+    if len(coordinates) < 2:
+        raise ValueError("Point needs [longitude, latitude]")
+    fields = dict(feature.get("properties") or {})
+    fields["longitude"], fields["latitude"] = coordinates[0], coordinates[1]
+    if len(coordinates) > 2 and fields.get("elevation") in (None, ""):
+        fields["elevation"] = coordinates[2]
+    return fields
+
+
+def read_geojson(stream):
+    """
+    Stream the features of a GeoJSON FeatureCollection. Other top-level
+    members are decoded and skipped; only the features array is streamed.
+    """
+    reader = _JSONReader(stream)
+    reader.expect("{")
+    row_number = 0
+    while reader.peek() != "}":
+        key = reader.value()
+        reader.expect(":")
+        if key != "features":
+            reader.value()
+        else:
+            reader.expect("[")
+            while reader.peek() != "]":
+                row_number += 1
+                feature = reader.value()
+                try:
+                    yield row_number, _feature_fields(feature)
+                except ValueError as e:
+                    yield row_number, e
+                if reader.peek() == ",":
+                    reader.expect(",")
+            reader.expect("]")
+        if reader.peek() == ",":
+            reader.expect(",")
+    reader.expect("}")
+
+
+READERS = {"csv": read_csv, "geojson": read_geojson, "ndjson": read_ndjson}
+
+
+def read_rows(stream, fmt):
+    """
+    Yield ``(row_number, values)`` for every row in ``stream``, where
+    ``values`` is the normalized column dict or a ValueError
+    """
+    for row_number, fields in READERS[fmt](stream):
+        if not isinstance(fields, ValueError):
+            try:
+                fields = normalize_row(fields)
+            except ValueError as e:
+                fields = e
+        yield row_number, fields
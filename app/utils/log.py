@@ -0,0 +1,178 @@
+"""
+Structured application logging.
+
+Modules log through ``logging.getLogger(__name__)``. ``init_app`` routes
+the ``app`` logger hierarchy through a QueueHandler so request threads only
+enqueue records; a QueueListener thread formats them (JSON lines by
+default) and writes them out. Levels are set globally with LOG_LEVEL and
+per module with LOG_LEVELS (``app.utils.weather_api=DEBUG,app.routes=INFO``).
+
+Every record carries the id of the request that produced it (from the
+incoming X-Request-ID header or generated, and echoed in the response).
+DEBUG records are sampled per request with LOG_DEBUG_SAMPLE_RATE, so a
+sampled request keeps all of its debug lines. Expensive debug payloads
+should be passed as arguments (``logger.debug("... %r", forecast)``) so
+they are only formatted for records that are actually written.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, request
+
+request_id = contextvars.ContextVar("request_id", default=None)
+# Whether DEBUG records of the current request are kept (None outside requests)
+debug_sampled = contextvars.ContextVar("debug_sampled", default=None)
+
+# LogRecord attributes that are not structured fields passed through ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+_listener = None
+debug_sample_rate = 1.0
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, request id and ``extra`` fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        if not getattr(record, "request_id", None):
+            record.request_id = "-"
+        return super().format(record)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Stamp records with the current request id and drop DEBUG records of
+    requests that were not sampled (or, outside requests, at the sample rate)
+    """
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        if record.levelno <= logging.DEBUG:
+            sampled = debug_sampled.get()
+            if sampled is None:
+                sampled = debug_sample_rate >= 1.0 or random.random() < debug_sample_rate
+            return sampled
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    # Merge args and render tracebacks in the calling thread (args may be
+    # mutated or released later) but leave formatting to the listener
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_levels(spec):
+    """Parse ``"name=LEVEL,name=LEVEL"`` into {logger name: level name}"""
+    levels = {}
+    for part in (spec or "").split(","):
+        name, _, level = part.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure(level="INFO", levels=None, fmt="json", sample_rate=1.0, stream=None):
+    """(Re)configure the ``app`` logger hierarchy; safe to call more than once"""
+    global _listener, debug_sample_rate
+    debug_sample_rate = sample_rate
+    if _listener is not None:
+        _listener.stop()
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter())
+    records = queue.SimpleQueue()
+    _listener = QueueListener(records, handler)
+    _listener.start()
+
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(ContextFilter())
+    root = logging.getLogger("app")
+    root.handlers = [queue_handler]
+    root.propagate = False
+    root.setLevel(level.upper())
+    for name, module_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+
+
+def _stop():
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_stop)
+
+
+def _begin_request():
+    g.log_tokens = (
+        request_id.set(request.headers.get("X-Request-ID", "")[:128] or uuid.uuid4().hex),
+        debug_sampled.set(debug_sample_rate >= 1.0 or random.random() < debug_sample_rate)
+    )
+
+
+def _tag_response(response):
+    response.headers.setdefault("X-Request-ID", request_id.get() or "")
+    return response
+
+
+def _end_request(exc=None):
+    tokens = g.pop("log_tokens", None)
+    if tokens:
+        request_id.reset(tokens[0])
+        debug_sampled.reset(tokens[1])
+
+
+def init_app(app):
+    """
+    Configure logging from LOG_LEVEL, LOG_LEVELS, LOG_FORMAT and
+    LOG_DEBUG_SAMPLE_RATE and tag every request with a request id
+    """
+    configure(
+        level=app.config.get("LOG_LEVEL", "INFO"),
+        levels=parse_levels(app.config.get("LOG_LEVELS")),
+        fmt=app.config.get("LOG_FORMAT", "json"),
+        sample_rate=app.config.get("LOG_DEBUG_SAMPLE_RATE", 1.0)
+    )
+    app.before_request(_begin_request)
+    app.after_request(_tag_response)
+    app.teardown_request(_end_request)
@@ -0,0 +1,271 @@
+"""
+Prometheus metrics in the text exposition format.
+
+Request latency (per route template and method), status counts and
+in-flight requests are recorded by Flask hooks, and SQLAlchemy query
+counts and durations by engine events; both only touch a few counters
+under one lock per request or query. Everything else (upstream hosts,
+caches, single-flight calls, the WeatherAPI quota, write-behind queues) is
+read at scrape time from the counters those modules already keep: each
+registers a collector with ``register`` that yields MetricFamily objects.
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request
+from sqlalchemy import event
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+QUERY_OPERATIONS = ("select", "insert", "update", "delete")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """(cumulative counts per bucket including +Inf, sum, count)"""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = []
+        running = 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+class MetricFamily:
+    """One metric name with its HELP/TYPE lines and labelled samples"""
+
+    def __init__(self, name, kind, help_text):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.samples = []  # (name suffix, labels, value)
+
+    def add(self, value, **labels):
+        self.samples.append(("", labels, value))
+        return self
+
+    def add_histogram(self, histogram, **labels):
+        cumulative, total, count = histogram.snapshot()
+        for bound, bucket_count in zip(histogram.buckets + (math.inf,), cumulative):
+            self.samples.append(("_bucket", dict(labels, le=_format_value(float(bound))), bucket_count))
+        self.samples.append(("_sum", labels, total))
+        self.samples.append(("_count", labels, count))
+        return self
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples:
+            label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+            lines.append(f"{self.name}{suffix}{{{label_text}}} {_format_value(value)}" if label_text
+                         else f"{self.name}{suffix} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Registry:
+    """Named collectors rendered together; re-registering a name replaces it"""
+
+    def __init__(self):
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, collector):
+        with self._lock:
+            self._collectors[name] = collector
+
+    def render(self):
+        with self._lock:
+            collectors = list(self._collectors.values())
+        families = [family for collector in collectors for family in collector()]
+        return "\n".join(family.render() for family in families) + "\n"
+
+
+registry = Registry()
+
+
+def register(name, collector):
+    """Add ``collector()`` (yielding MetricFamily objects) to the /metrics output"""
+    registry.register(name, collector)
+
+
+def render():
+    return registry.render()
+
+
+_caches = {}
+
+
+def register_cache(name, stats):
+    """
+    Report a cache under ``cache="name"``; ``stats()`` returns a dict like
+    TTLCache.stats (hits, stale_hits, misses, evictions, entries, hit_ratio)
+    """
+    _caches[name] = stats
+    register("caches", _collect_caches)
+
+
+def _collect_caches():
+    counters = [
+        ("hits", "counter", "Fresh cache hits"),
+        ("stale_hits", "counter", "Stale cache hits served while refreshing"),
+        ("misses", "counter", "Cache misses"),
+        ("evictions", "counter", "Entries evicted to stay within max_entries"),
+        ("entries", "gauge", "Entries currently cached"),
+        ("hit_ratio", "gauge", "(hits + stale hits) / lookups since startup")
+    ]
+    families = [
+        MetricFamily(f"cache_{field}" + ("_total" if kind == "counter" else ""), kind, description)
+        for field, kind, description in counters
+    ]
+    for name, stats in sorted(_caches.items()):
+        values = stats()
+        for (field, _, _), family in zip(counters, families):
+            family.add(values.get(field, 0), cache=name)
+    return families
+
+
+class RequestMetrics:
+    """Latency histograms, status counts and in-flight gauges per route"""
+
+    def __init__(self):
+        self.durations = {}  # (route, method) -> Histogram
+        self.responses = {}  # (route, method, status) -> count
+        self.in_flight = {}  # route -> count
+        self._lock = threading.Lock()
+
+    def start(self, route):
+        with self._lock:
+            self.in_flight[route] = self.in_flight.get(route, 0) + 1
+
+    def finish(self, route, method, status, elapsed):
+        with self._lock:
+            self.in_flight[route] -= 1
+            self.responses[(route, method, status)] = self.responses.get((route, method, status), 0) + 1
+            histogram = self.durations.get((route, method))
+            if histogram is None:
+                histogram = self.durations[(route, method)] = Histogram()
+        histogram.observe(elapsed)
+
+    def collect(self):
+        with self._lock:
+            durations = dict(self.durations)
+            responses = dict(self.responses)
+            in_flight = dict(self.in_flight)
+        latency = MetricFamily("http_request_duration_seconds", "histogram", "Request latency by route template")
+        for (route, method), histogram in sorted(durations.items()):
+            latency.add_histogram(histogram, route=route, method=method)
+        counts = MetricFamily("http_requests_total", "counter", "Responses by route template and status")
+        for (route, method, status), count in sorted(responses.items()):
+            counts.add(count, route=route, method=method, status=status)
+        active = MetricFamily("http_requests_in_flight", "gauge", "Requests currently being handled")
+        for route, count in sorted(in_flight.items()):
+            active.add(count, route=route)
+        return [latency, counts, active]
+
+
+class QueryMetrics:
+    """SQLAlchemy statement counts, errors and durations by operation"""
+
+    def __init__(self):
+        self.durations = {operation: Histogram(QUERY_BUCKETS) for operation in QUERY_OPERATIONS + ("other",)}
+        self.errors = 0
+
+    def observe(self, statement, elapsed):
+        operation = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other"
+        self.durations.get(operation, self.durations["other"]).observe(elapsed)
+
+    def collect(self):
+        latency = MetricFamily("db_query_duration_seconds", "histogram", "SQL statement duration by operation")
+        for operation, histogram in self.durations.items():
+            latency.add_histogram(histogram, operation=operation)
+        errors = MetricFamily("db_query_errors_total", "counter", "SQL statements that raised").add(self.errors)
+        return [latency, errors]
+
+
+request_metrics = RequestMetrics()
+query_metrics = QueryMetrics()
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def _begin_request():
+    g.metrics_route = _route()
+    g.metrics_started = time.perf_counter()
+    request_metrics.start(g.metrics_route)
+
+
+def _record_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _end_request(exc=None):
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        request_metrics.finish(
+            g.metrics_route, request.method, g.get("metrics_status", 500), time.perf_counter() - started
+        )
+
+
+def instrument_engine(engine):
+    """Time every statement executed on ``engine``"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        query_metrics.observe(statement, time.perf_counter() - conn.info["metrics_started"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("metrics_started") if context.connection is not None else None
+        if started:
+            started.pop()
+        query_metrics.errors += 1
+
+
+def init_app(app, db):
+    """Record per-request metrics for ``app`` and per-query metrics for its engine"""
+    app.before_request(_begin_request)
+    app.after_request(_record_status)
+    app.teardown_request(_end_request)
+    with app.app_context():
+        instrument_engine(db.engine)
+    register("http", request_metrics.collect)
+    register("db", query_metrics.collect)
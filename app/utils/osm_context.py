@@ -0,0 +1,426 @@
+"""
+Local store of OpenStreetMap context around saved locations.
+
+Features are fetched from Overpass one slippy-map tile (zoom 15 by default,
+roughly 1 km across) at a time and kept in a local SQLite file with an
+R*Tree index over their bounding boxes. A feature that spans several tiles
+is stored once, keyed by its OSM type and id. The drainage features used
+for risk scoring are then answered from the store without a network hop;
+tiles are only re-fetched once they are older than the configured maximum
+age.
+
+Geometry is kept compact: int32 coordinates in OSM's native 1e-7 degree
+resolution. Ways keep their full geometry, tagged nodes their position and
+relations only their bounding box (member geometry of boundary relations
+can be megabytes per tile).
+"""
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import requests
+
+from app.utils import risk_engine, upstream
+from app.utils.geo import EARTH_RADIUS_KM, bbox_around
+from app.utils.singleflight import flights
+
+logger = logging.getLogger(__name__)
+
+OVERPASS_URL = "http://overpass-api.de/api/interpreter"
+COORDINATE_SCALE = 10 ** 7
+# Feature key = osm id * 4 + type code, so one integer keys both tables
+OSM_TYPES = ("node", "way", "relation")
+
+# Way classification for drainage features
+WATERWAYS = {"river", "stream", "canal", "drain", "ditch", "brook"}
+IMPERVIOUS_LANDUSE = {"commercial", "industrial", "retail", "garages"}
+# Highway class -> half of a typical paved width in metres
+ROAD_HALF_WIDTHS = {
+    "motorway": 7.0, "trunk": 7.0, "primary": 6.0, "secondary": 5.0, "tertiary": 4.0,
+    "unclassified": 3.0, "residential": 3.0, "service": 2.5, "living_street": 2.5,
+    "motorway_link": 4.0, "trunk_link": 4.0, "primary_link": 4.0, "secondary_link": 3.5, "tertiary_link": 3.0
+}
+DRAINAGE_KINDS = ("water", "impervious", "road")
+# Impervious share is measured on a grid of this many points across the disc diameter
+DRAINAGE_GRID_STEPS = 31
+# Drainage features memoized per rounded point (cleared when a tile is stored)
+DRAINAGE_CACHE_ENTRIES = 4096
+
+
+def tile_for(lat, lng, zoom):
+    """Slippy-map (x, y) of the tile containing a coordinate"""
+    n = 2 ** zoom
+    lat = max(min(float(lat), 85.0511), -85.0511)
+    x = int((float(lng) + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(x, y, zoom):
+    """(south, west, north, east) of a slippy-map tile"""
+    n = 2 ** zoom
+
+    def lat_of(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat_of(y + 1), x / n * 360.0 - 180.0, lat_of(y), (x + 1) / n * 360.0 - 180.0
+
+
+def _lng_ranges(min_lng, max_lng):
+    # A box with min_lng > max_lng crosses the antimeridian
+    if min_lng > max_lng:
+        return [(min_lng, 180.0), (-180.0, max_lng)]
+    return [(min_lng, max_lng)]
+
+
+def tiles_covering(lat, lng, radius_m, zoom):
+    """Tiles that together cover a circle of ``radius_m`` around a point"""
+    min_lat, min_lng, max_lat, max_lng = bbox_around(lat, lng, radius_m / 1000.0)
+    tiles = []
+    for west, east in _lng_ranges(min_lng, max_lng):
+        min_x, min_y = tile_for(max_lat, west, zoom)
+        max_x, max_y = tile_for(min_lat, east, zoom)
+        tiles.extend((x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1))
+    return tiles
+
+
+def classify(osm_type, tags):
+    """Drainage kind of a feature: water, impervious, road or other"""
+    if osm_type != "way":
+        return "other"
+    if tags.get("waterway") in WATERWAYS or tags.get("natural") == "water":
+        return "water"
+    if "building" in tags or tags.get("amenity") == "parking" or tags.get("landuse") in IMPERVIOUS_LANDUSE:
+        return "impervious"
+    if tags.get("highway") in ROAD_HALF_WIDTHS:
+        return "road"
+    return "other"
+
+
+def _element_geometry(element):
+    # Interleaved lat/lng pairs for the element, or None if it has none
+    if element["type"] == "node":
+        return [(element["lat"], element["lon"])] if "lat" in element else None
+    if element["type"] == "way":
+        points = [(point["lat"], point["lon"]) for point in element.get("geometry") or [] if point]
+        return points or None
+    bounds = element.get("bounds")
+    if not bounds:
+        return None
+    return [(bounds["minlat"], bounds["minlon"]), (bounds["maxlat"], bounds["maxlon"])]
+
+
+def _project(coordinates, lat, lng):
+    # Local equirectangular metres around (lat, lng); plenty accurate at these radii
+    metres_per_degree = math.radians(1) * EARTH_RADIUS_KM * 1000
+    dlng = (coordinates[:, 1] - lng + 180.0) % 360.0 - 180.0
+    return dlng * metres_per_degree * math.cos(math.radians(lat)), (coordinates[:, 0] - lat) * metres_per_degree
+
+
+def _segment_distances(px, py, ax, ay, bx, by):
+    """(points, segments) matrix of distances from (px, py) to segments a-b"""
+    dx, dy = bx - ax, by - ay
+    length2 = dx * dx + dy * dy
+    relx, rely = px[:, None] - ax, py[:, None] - ay
+    t = np.clip((relx * dx + rely * dy) / np.where(length2 == 0, 1, length2), 0, 1)
+    return np.hypot(relx - t * dx, rely - t * dy)
+
+
+def _crossings(px, py, ax, ay, bx, by):
+    """(points, edges) matrix of whether a ray east from each point crosses each edge"""
+    py_column = py[:, None]
+    straddles = (ay > py_column) != (by > py_column)
+    crossing_x = ax + (bx - ax) * (py_column - ay) / np.where(by == ay, 1, by - ay)
+    return straddles & (px[:, None] < crossing_x)
+
+
+def _is_closed(coordinates):
+    return len(coordinates) > 3 and (coordinates[0] == coordinates[-1]).all()
+
+
+class OSMContextStore:
+    """
+    Tile-fetched OSM features in a local SQLite file with an R*Tree index.
+    """
+
+    def __init__(self, path=None, zoom=15, max_age=30 * 86400, url=OVERPASS_URL):
+        self.path = path
+        self.zoom = zoom
+        self.max_age = max_age
+        self.url = url
+        self._conn = None
+        self._lock = threading.Lock()
+        self._drainage = OrderedDict()
+
+    def open(self, path, zoom=None, max_age=None, url=None):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            if zoom is not None:
+                self.zoom = zoom
+            if max_age is not None:
+                self.max_age = max_age
+            if url is not None:
+                self.url = url
+            self.path = path
+            self._drainage.clear()
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS osm_tiles ("
+                "zoom INTEGER NOT NULL, x INTEGER NOT NULL, y INTEGER NOT NULL, fetched_at REAL NOT NULL, "
+                "PRIMARY KEY (zoom, x, y)) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS osm_features ("
+                "id INTEGER PRIMARY KEY, kind TEXT NOT NULL, tags TEXT NOT NULL, geometry BLOB NOT NULL);"
+                "CREATE VIRTUAL TABLE IF NOT EXISTS osm_feature_index "
+                "USING rtree(id, min_lat, max_lat, min_lng, max_lng);"
+            )
+            self._conn.commit()
+
+    # Tiles
+
+    def _tile_ages(self, tiles):
+        if self._conn is None or not tiles:
+            return {}
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT x, y, fetched_at FROM osm_tiles WHERE zoom = ? AND (" +
+                " OR ".join(["(x = ? AND y = ?)"] * len(tiles)) + ")",
+                [self.zoom] + [part for tile in tiles for part in tile]
+            ).fetchall()
+        return {(x, y): now - fetched_at for x, y, fetched_at in rows}
+
+    def has_tiles(self, lat, lng, radius_m):
+        """Whether every tile around a point has been fetched (however long ago)"""
+        tiles = tiles_covering(lat, lng, radius_m, self.zoom)
+        return len(self._tile_ages(tiles)) == len(set(tiles))
+
+    def _query(self, x, y):
+        south, west, north, east = tile_bounds(x, y, self.zoom)
+        # Tagged nodes and ways with full geometry; relations by bounding box only
+        return (
+            f"[out:json][timeout:25][bbox:{south},{west},{north},{east}];"
+            '(node[~"."~"."];way;);out tags geom qt;'
+            "rel;out tags bb qt;"
+        )
+
+    def fetch_tile(self, x, y):
+        """Download one tile from Overpass and store its features"""
+        logger.info("Fetching OSM tile %d/%d/%d", self.zoom, x, y)
+        # Overpass may take up to its 25 s server-side timeout to answer
+        response = upstream.get(
+            self.url, params={"data": self._query(x, y)}, timeout=(upstream.client.connect_timeout, 30)
+        )
+        response.raise_for_status()
+        rows = []
+        bounds = []
+        for element in response.json().get("elements", []):
+            if element.get("type") not in OSM_TYPES:
+                continue
+            points = _element_geometry(element)
+            if points is None:
+                continue
+            key = element["id"] * 4 + OSM_TYPES.index(element["type"])
+            tags = element.get("tags") or {}
+            coordinates = np.round(np.array(points, dtype=np.float64) * COORDINATE_SCALE).astype("<i4")
+            rows.append((key, classify(element["type"], tags), json.dumps(tags), coordinates.tobytes()))
+            lats, lngs = coordinates[:, 0] / COORDINATE_SCALE, coordinates[:, 1] / COORDINATE_SCALE
+            bounds.append((key, lats.min(), lats.max(), lngs.min(), lngs.max()))
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO osm_features VALUES (?, ?, ?, ?)", rows)
+                self._conn.executemany("INSERT OR REPLACE INTO osm_feature_index VALUES (?, ?, ?, ?, ?)", bounds)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO osm_tiles VALUES (?, ?, ?, ?)", (self.zoom, x, y, time.time())
+                )
+            self._drainage.clear()
+        return len(rows)
+
+    def ensure_tiles(self, lat, lng, radius_m):
+        """
+        Fetch the missing or expired tiles around a point; concurrent callers
+        wait for a tile another request is already fetching. Raises requests
+        exceptions when a tile that has never been fetched cannot be
+        downloaded; an expired tile that fails to refresh is kept.
+        Returns the number of tiles fetched.
+        """
+        tiles = sorted(set(tiles_covering(lat, lng, radius_m, self.zoom)))
+        ages = self._tile_ages(tiles)
+        fetched = 0
+        for tile in tiles:
+            if ages.get(tile, math.inf) >= self.max_age:
+                fetched += flights.do(("overpass", self.zoom) + tile, lambda: self._refresh_tile(tile))
+        return fetched
+
+    def _refresh_tile(self, tile):
+        age = self._tile_ages([tile]).get(tile, math.inf)
+        if age < self.max_age:
+            return 0  # fetched since the caller looked
+        try:
+            self.fetch_tile(*tile)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            if age == math.inf:
+                raise
+            logger.warning("Keeping expired OSM tile %s: %s", tile, e)
+            return 0
+        return 1
+
+    # Queries
+
+    def _candidates(self, lat, lng, radius_m, kinds=None):
+        # (key, kind, tags, coordinates) whose bounding boxes intersect the circle's box
+        if self._conn is None:
+            return []
+        min_lat, min_lng, max_lat, max_lng = bbox_around(lat, lng, radius_m / 1000.0)
+        kind_filter = ""
+        if kinds:
+            kind_filter = " AND f.kind IN (" + ", ".join("?" * len(kinds)) + ")"
+        found = []
+        with self._lock:
+            for west, east in _lng_ranges(min_lng, max_lng):
+                found.extend(self._conn.execute(
+                    "SELECT f.id, f.kind, f.tags, f.geometry FROM osm_feature_index i "
+                    "JOIN osm_features f ON f.id = i.id "
+                    "WHERE i.min_lat <= ? AND i.max_lat >= ? AND i.min_lng <= ? AND i.max_lng >= ?" + kind_filter,
+                    [max_lat, min_lat, east, west] + list(kinds or ())
+                ).fetchall())
+        return [
+            (key, kind, tags, np.frombuffer(geometry, dtype="<i4").reshape(-1, 2) / COORDINATE_SCALE)
+            for key, kind, tags, geometry in found
+        ]
+
+    def drainage_features(self, lat, lng, radius_m):
+        """
+        Drainage context of a point from the stored tiles, or None when they
+        have not been fetched: ``impervious_share`` of the disc covered by
+        buildings, parking, commercial/industrial land and paved roads,
+        ``waterways`` within it and ``nearest_waterway_m`` (None if none)
+        """
+        key = (round(float(lat), 5), round(float(lng), 5), radius_m)
+        with self._lock:
+            if key in self._drainage:
+                self._drainage.move_to_end(key)
+                return self._drainage[key]
+        if self._conn is None or not self.has_tiles(lat, lng, radius_m):
+            return None
+        features = self._measure_drainage(lat, lng, radius_m)
+        with self._lock:
+            self._drainage[key] = features
+            while len(self._drainage) > DRAINAGE_CACHE_ENTRIES:
+                self._drainage.popitem(last=False)
+        return features
+
+    def _measure_drainage(self, lat, lng, radius_m):
+        offsets = np.linspace(-radius_m, radius_m, DRAINAGE_GRID_STEPS)
+        in_disc = np.hypot(offsets[None, :], offsets[:, None]) <= radius_m
+        covered = np.zeros(in_disc.shape, dtype=bool)  # rows are y offsets, columns x offsets
+        candidates = self._candidates(lat, lng, radius_m, DRAINAGE_KINDS)
+        if not candidates:
+            return {"impervious_share": 0.0, "waterways": 0, "nearest_waterway_m": None}
+
+        # Project every vertex at once and describe each segment by its feature
+        lengths = np.array([len(coordinates) for _, _, _, coordinates in candidates])
+        coordinates = np.concatenate([coordinates for _, _, _, coordinates in candidates])
+        xs, ys = _project(coordinates, lat, lng)
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        closed = (lengths > 3) & (coordinates[starts] == coordinates[ends - 1]).all(axis=1)
+        kinds = np.array([kind for _, kind, _, _ in candidates])
+        half_widths = np.array([
+            ROAD_HALF_WIDTHS[json.loads(tags)["highway"]] if kind == "road" else 0.0
+            for _, kind, tags, _ in candidates
+        ])
+        feature = np.repeat(np.arange(len(candidates)), lengths)[:-1]
+        segment = np.ones(len(xs) - 1, dtype=bool)
+        segment[ends[:-1] - 1] = False  # no segment joins one feature to the next
+        ax, ay, bx, by = xs[:-1], ys[:-1], xs[1:], ys[1:]
+
+        # Impervious areas, one grid row at a time: a ring's crossings of the
+        # row pair up (in x order) into the intervals that lie inside it
+        rings = segment & (kinds[feature] == "impervious") & closed[feature]
+        for row, y in enumerate(offsets):
+            crosses = rings & ((ay > y) != (by > y))
+            if not crosses.any():
+                continue
+            crossing_x = ax[crosses] + (bx[crosses] - ax[crosses]) * (y - ay[crosses]) / (by[crosses] - ay[crosses])
+            crossing_x = crossing_x[np.lexsort((crossing_x, feature[crosses]))]
+            left, right = crossing_x[0::2], crossing_x[1::2]
+            covered[row] |= ((offsets[:, None] >= left) & (offsets[:, None] < right)).any(axis=1)
+
+        # Paved roads: grid points within half a road width of a road segment
+        roads = segment & (kinds[feature] == "road")
+        if roads.any():
+            px, py = np.meshgrid(offsets, offsets)
+            distances = _segment_distances(px.ravel(), py.ravel(), ax[roads], ay[roads], bx[roads], by[roads])
+            covered |= (distances <= half_widths[feature[roads]]).any(axis=1).reshape(covered.shape)
+
+        # Waterways: distance from the point itself (zero inside water areas)
+        water = segment & (kinds[feature] == "water")
+        nearest = np.full(len(candidates), np.inf)
+        if water.any():
+            origin = np.zeros(1)
+            distances = _segment_distances(origin, origin, ax[water], ay[water], bx[water], by[water])[0]
+            np.minimum.at(nearest, feature[water], distances)
+            crossings = np.zeros(len(candidates), dtype=np.int64)
+            np.add.at(crossings, feature[water], _crossings(origin, origin, ax[water], ay[water], bx[water], by[water])[0])
+            nearest[closed & (crossings % 2 == 1)] = 0.0
+        nearest = nearest[nearest <= radius_m]
+        return {
+            "impervious_share": float(covered[in_disc].mean()),
+            "waterways": len(nearest),
+            "nearest_waterway_m": round(float(nearest.min()), 1) if len(nearest) else None
+        }
+
+store = OSMContextStore()
+drainage_radius = 200
+
+
+def init_app(app):
+    """
+    Open the OSM context store (defaults to the app instance folder) and
+    apply the OSM_* settings
+    """
+    global drainage_radius
+    path = app.config.get('OSM_CACHE_PATH')
+    if not path:
+        os.makedirs(app.instance_path, exist_ok=True)
+        path = os.path.join(app.instance_path, 'osm_context.db')
+    store.open(
+        path,
+        zoom=app.config.get('OSM_TILE_ZOOM'),
+        max_age=app.config.get('OSM_TILE_MAX_AGE'),
+        url=app.config.get('OVERPASS_URL')
+    )
+    drainage_radius = app.config.get('DRAINAGE_RADIUS_M', drainage_radius)
+
+
+def prefetch(lat, lng):
+    """Make sure the drainage context of a point is stored; returns tiles fetched"""
+    return store.ensure_tiles(lat, lng, drainage_radius)
+
+
+def drainage_risks(points, rng=None):
+    """
+    Drainage factor scores for a list of (lat, lng) points from stored
+    context only (never fetches). Points whose tiles have not been fetched
+    keep the random placeholder score.
+    """
+    shares = np.full(len(points), np.nan)
+    nearest = np.full(len(points), np.nan)
+    for i, (lat, lng) in enumerate(points):
+        try:
+            features = store.drainage_features(float(lat), float(lng), drainage_radius)
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning("Error reading drainage context: %s", e)
+            features = None
+        if features:
+            shares[i] = features["impervious_share"]
+            if features["nearest_waterway_m"] is not None:
+                nearest[i] = features["nearest_waterway_m"]
+    return risk_engine.drainage_scores(shares, nearest, rng=rng)
@@ -0,0 +1,214 @@
+"""
+Upstream quota budget for WeatherAPI calls.
+
+Usage is counted per UTC day and month in a small SQLite file, so the
+count survives restarts and is shared by every worker process on the host.
+Each period with a limit acts as a token bucket that refills evenly over
+the period (``limit / period length`` per second, plus ``burst`` tokens up
+front) and keeps unused tokens:
+
+- interactive calls may spend up to the hard limit;
+- background calls (scheduled refreshes, stale-while-revalidate refreshes)
+  must stay within the paced allowance and may not dip into the last
+  ``reserve`` share of the limit, which is kept for interactive traffic.
+
+Callers that are refused degrade to cached data (see app.utils.weather_api).
+"""
+import calendar
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from app.utils import metrics
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+
+def period_window(period, now):
+    """(bucket label, start, end) epoch seconds of the UTC day or month containing ``now``"""
+    moment = datetime.fromtimestamp(now, timezone.utc)
+    if period == "day":
+        start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        return start.strftime("%Y-%m-%d"), start.timestamp(), start.timestamp() + 86400
+    start = moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    days = calendar.monthrange(start.year, start.month)[1]
+    return start.strftime("%Y-%m"), start.timestamp(), start.timestamp() + days * 86400
+
+
+class QuotaExceeded(Exception):
+    """Raised by QuotaManager.acquire when a call is not within budget"""
+
+    def __init__(self, api, priority, period):
+        super().__init__(f"{api} {period} quota exhausted for {priority} calls")
+        self.api = api
+        self.priority = priority
+        self.period = period
+
+
+class QuotaManager:
+    """
+    Persistent per-period call budget for one upstream API. A limit of 0
+    means unlimited (calls are still counted).
+    """
+
+    def __init__(self, api, daily_limit=0, monthly_limit=0, reserve=0.1, burst=100, clock=time.time):
+        self.api = api
+        self.limits = {"day": daily_limit, "month": monthly_limit}
+        self.reserve = reserve
+        self.burst = burst
+        self.clock = clock
+        self.refused = {priority: 0 for priority in PRIORITIES}
+        self.fallbacks = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def open(self, path):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            # Autocommit mode: acquire runs its own BEGIN IMMEDIATE transaction
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS upstream_usage ("
+                "api TEXT NOT NULL, period TEXT NOT NULL, bucket TEXT NOT NULL, calls INTEGER NOT NULL, "
+                "PRIMARY KEY (api, period, bucket)) WITHOUT ROWID"
+            )
+
+    def configure(self, daily_limit=None, monthly_limit=None, reserve=None, burst=None):
+        with self._lock:
+            if daily_limit is not None:
+                self.limits["day"] = daily_limit
+            if monthly_limit is not None:
+                self.limits["month"] = monthly_limit
+            if reserve is not None:
+                self.reserve = reserve
+            if burst is not None:
+                self.burst = burst
+
+    def _used(self, now):
+        # {period: (bucket, start, end, calls)}; must be called with the lock held
+        usage = {}
+        for period in self.limits:
+            bucket, start, end = period_window(period, now)
+            row = self._conn.execute(
+                "SELECT calls FROM upstream_usage WHERE api = ? AND period = ? AND bucket = ?",
+                (self.api, period, bucket)
+            ).fetchone() if self._conn is not None else None
+            usage[period] = (bucket, start, end, row[0] if row else 0)
+        return usage
+
+    def _allowance(self, period, priority, start, end, calls, now):
+        # Calls this priority may still make in the period (None = unlimited)
+        limit = self.limits[period]
+        if not limit:
+            return None
+        if priority == INTERACTIVE:
+            return max(0, limit - calls)
+        paced = limit * (now - start) / (end - start) + self.burst
+        return max(0, int(min(limit * (1 - self.reserve), paced) - calls))
+
+    def available(self, priority=INTERACTIVE):
+        """How many calls ``priority`` traffic may make right now (None = unlimited)"""
+        now = self.clock()
+        with self._lock:
+            usage = self._used(now)
+        allowances = [
+            self._allowance(period, priority, start, end, calls, now)
+            for period, (_, start, end, calls) in usage.items()
+        ]
+        allowances = [allowance for allowance in allowances if allowance is not None]
+        return min(allowances) if allowances else None
+
+    def low(self):
+        """Whether usage has reached the interactive reserve of any limit"""
+        return self.available(BACKGROUND) == 0
+
+    def acquire(self, priority=INTERACTIVE):
+        """
+        Record one call, or raise QuotaExceeded (recording nothing) if it is
+        not within the budget for ``priority``
+        """
+        now = self.clock()
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                usage = self._used(now)
+                for period, (_, start, end, calls) in usage.items():
+                    if self._allowance(period, priority, start, end, calls, now) == 0:
+                        self.refused[priority] += 1
+                        raise QuotaExceeded(self.api, priority, period)
+                for period, (bucket, _, _, _) in usage.items():
+                    self._conn.execute(
+                        "INSERT INTO upstream_usage (api, period, bucket, calls) VALUES (?, ?, ?, 1) "
+                        "ON CONFLICT (api, period, bucket) DO UPDATE SET calls = calls + 1",
+                        (self.api, period, bucket)
+                    )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def status(self):
+        """
+        Usage per period with the remaining budget, the current burn rate and
+        the projected exhaustion time (None if the limit outlasts the period
+        at the current rate)
+        """
+        now = self.clock()
+        with self._lock:
+            usage = self._used(now)
+        periods = {}
+        for period, (bucket, start, end, calls) in usage.items():
+            limit = self.limits[period]
+            rate = calls / max(now - start, 1.0)  # calls per second so far this period
+            exhaustion = None
+            if limit and calls >= limit:
+                exhaustion = now
+            elif limit and rate > 0 and now + (limit - calls) / rate < end:
+                exhaustion = now + (limit - calls) / rate
+            periods[period] = {
+                "bucket": bucket,
+                "limit": limit or None,
+                "used": calls,
+                "remaining": max(0, limit - calls) if limit else None,
+                "background_available": self._allowance(period, BACKGROUND, start, end, calls, now),
+                "calls_per_hour": round(rate * 3600, 2),
+                "resets_at": datetime.fromtimestamp(end, timezone.utc).isoformat(),
+                "projected_exhaustion": (
+                    datetime.fromtimestamp(exhaustion, timezone.utc).isoformat() if exhaustion else None
+                )
+            }
+        return {
+            "api": self.api,
+            "reserve": self.reserve,
+            "low": any(
+                self._allowance(period, BACKGROUND, start, end, calls, now) == 0
+                for period, (_, start, end, calls) in usage.items()
+            ),
+            "refused": dict(self.refused),
+            "fallbacks": self.fallbacks,
+            "periods": periods
+        }
+
+    def collect(self):
+        status = self.status()
+        used = metrics.MetricFamily("upstream_quota_used", "gauge", "Calls counted in the current quota period")
+        remaining = metrics.MetricFamily("upstream_quota_remaining", "gauge", "Calls left in the current quota period")
+        for period, values in status["periods"].items():
+            used.add(values["used"], api=self.api, period=period)
+            if values["remaining"] is not None:
+                remaining.add(values["remaining"], api=self.api, period=period)
+        refused = metrics.MetricFamily("upstream_quota_refused_total", "counter", "Calls refused for lack of budget")
+        for priority, count in status["refused"].items():
+            refused.add(count, api=self.api, priority=priority)
+        fallbacks = metrics.MetricFamily(
+            "upstream_quota_fallbacks_total", "counter", "Expired cached responses served to save budget"
+        ).add(status["fallbacks"], api=self.api)
+        return [used, remaining, refused, fallbacks]
@@ -0,0 +1,201 @@
+"""
+Vectorized flood-risk scoring.
+
+Every function here works on columnar NumPy arrays so thousands of locations
+are scored in a single pass. The thresholds are the ones the API has always
+used; the per-location endpoints are thin wrappers over these functions.
+"""
+import numpy as np
+
+FACTORS = ("rainfall_risk", "elevation_risk", "humidity_risk", "drainage_risk")
+MAX_FACTOR_SCORE = 3
+MAX_POSSIBLE_RISK = len(FACTORS) * MAX_FACTOR_SCORE
+
+# Average daily rainfall (mm) above each threshold scores 1, 2, 3
+RAINFALL_THRESHOLDS = (10, 30, 50)
+# Elevation (m) below each threshold scores 1, 2, 3
+ELEVATION_THRESHOLDS = (20, 10, 5)
+# Average humidity (%) above each threshold scores 1, 2, 3
+HUMIDITY_THRESHOLDS = (60, 70, 80)
+# Share of impervious ground around a location above each threshold scores 1, 2, 3
+IMPERVIOUS_THRESHOLDS = (0.2, 0.4, 0.6)
+# A waterway this close (m) adds 1 to the drainage score
+WATERWAY_NEAR_M = 50
+# Risk percentage at or above which a location is MEDIUM / HIGH
+RISK_LEVEL_THRESHOLDS = (50, 75)
+
+
+def to_float(value, default=0.0):
+    """
+    Convert an upstream field to float the way the API always has: None and
+    unparseable values become ``default`` and lists use their first element
+    """
+    if value is None:
+        return default
+    if isinstance(value, list):
+        value = value[0] if value else default
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return default
+
+
+def forecast_columns(forecasts):
+    """
+    Stack the arrays of parsed forecasts (app.utils.forecast.Forecast) into
+    scoring columns.
+
+    Returns a dict with ``current_rainfall`` (N,), ``daily_rainfall`` and
+    ``daily_humidity`` (N, D) padded with NaN, and ``day_counts`` (N,).
+    """
+    count = len(forecasts)
+    day_counts = np.array([forecast.day_count for forecast in forecasts], dtype=np.int64)
+    width = int(day_counts.max()) if count else 0
+
+    current_rainfall = np.array([forecast.current.precipitation for forecast in forecasts], dtype=np.float64)
+    daily_rainfall = np.full((count, width), np.nan)
+    daily_humidity = np.full((count, width), np.nan)
+    for i, forecast in enumerate(forecasts):
+        daily_rainfall[i, :day_counts[i]] = forecast.precip
+        daily_humidity[i, :day_counts[i]] = forecast.humidity
+
+    return {
+        "current_rainfall": current_rainfall,
+        "daily_rainfall": daily_rainfall,
+        "daily_humidity": daily_humidity,
+        "day_counts": day_counts
+    }
+
+
+def _row_sums(matrix):
+    # Accumulate column by column so sums match Python's left-to-right sum()
+    # exactly; NaN padding contributes nothing.
+    totals = np.zeros(matrix.shape[0])
+    for column in matrix.T:
+        totals += np.where(np.isnan(column), 0.0, column)
+    return totals
+
+
+def _score_above(values, thresholds):
+    low, mid, high = thresholds
+    return np.select([values > high, values > mid, values > low], [3, 2, 1], 0)
+
+
+def _score_below(values, thresholds):
+    low, mid, high = thresholds
+    return np.select([values < high, values < mid, values < low], [3, 2, 1], 0)
+
+
+def random_drainage_risk(count, rng=None):
+    """
+    Placeholder drainage factor for locations without stored OSM context:
+    uniform in [0.5, 1.5] rounded half-to-even like round()
+    """
+    rng = rng or np.random.default_rng()
+    return np.rint(rng.uniform(0.5, 1.5, count)).astype(np.int64)
+
+
+def drainage_scores(impervious_share, nearest_waterway_m, rng=None):
+    """
+    Drainage factor from OSM context: impervious share scored against
+    IMPERVIOUS_THRESHOLDS, plus one for a waterway within WATERWAY_NEAR_M,
+    capped at MAX_FACTOR_SCORE. Locations without context (NaN share) keep
+    the random placeholder.
+    """
+    impervious_share = np.asarray(impervious_share, dtype=np.float64)
+    nearest_waterway_m = np.asarray(nearest_waterway_m, dtype=np.float64)
+    scores = _score_above(impervious_share, IMPERVIOUS_THRESHOLDS) + (nearest_waterway_m <= WATERWAY_NEAR_M)
+    scores = np.minimum(scores, MAX_FACTOR_SCORE).astype(np.int64)
+    unknown = np.isnan(impervious_share)
+    if unknown.any():
+        scores[unknown] = random_drainage_risk(int(unknown.sum()), rng)
+    return scores
+
+
+def score_forecasts(current_rainfall, daily_rainfall, daily_humidity, day_counts, elevation, drainage_risk=None):
+    """
+    Score N locations in one vectorized pass.
+
+    ``elevation`` is (N,) in metres with missing values as 0. Returns a dict
+    of (N,) arrays: the four factor scores, ``total_risk_score``,
+    ``risk_percentage``, ``risk_level``, ``water_level`` and the derived
+    ``forecast_rainfall``, ``avg_rainfall`` and ``avg_humidity``.
+    """
+    current_rainfall = np.asarray(current_rainfall, dtype=np.float64)
+    daily_rainfall = np.asarray(daily_rainfall, dtype=np.float64)
+    daily_humidity = np.asarray(daily_humidity, dtype=np.float64)
+    day_counts = np.asarray(day_counts, dtype=np.int64)
+    elevation = np.asarray(elevation, dtype=np.float64)
+    if drainage_risk is None:
+        drainage_risk = random_drainage_risk(len(current_rainfall))
+    drainage_risk = np.asarray(drainage_risk, dtype=np.int64)
+
+    forecast_rainfall = _row_sums(daily_rainfall)
+    avg_rainfall = (current_rainfall + forecast_rainfall) / (day_counts + 1)
+    humidity_total = _row_sums(daily_humidity)
+    avg_humidity = np.divide(
+        humidity_total, day_counts, out=np.zeros_like(humidity_total), where=day_counts > 0
+    )
+
+    rainfall_risk = _score_above(avg_rainfall, RAINFALL_THRESHOLDS)
+    elevation_risk = _score_below(elevation, ELEVATION_THRESHOLDS)
+    humidity_risk = _score_above(avg_humidity, HUMIDITY_THRESHOLDS)
+
+    total_risk_score = rainfall_risk + elevation_risk + humidity_risk + drainage_risk
+    risk_percentage = (total_risk_score / MAX_POSSIBLE_RISK) * 100
+    medium, high = RISK_LEVEL_THRESHOLDS
+    risk_level = np.where(
+        risk_percentage >= high, "HIGH", np.where(risk_percentage >= medium, "MEDIUM", "LOW")
+    )
+    water_level = avg_rainfall * 0.1 * (1 + (risk_percentage / 100))
+
+    return {
+        "rainfall_risk": rainfall_risk,
+        "elevation_risk": elevation_risk,
+        "humidity_risk": humidity_risk,
+        "drainage_risk": drainage_risk,
+        "total_risk_score": total_risk_score,
+        "risk_percentage": risk_percentage,
+        "risk_level": risk_level,
+        "water_level": water_level,
+        "current_rainfall": current_rainfall,
+        "forecast_rainfall": forecast_rainfall,
+        "avg_rainfall": avg_rainfall,
+        "avg_humidity": avg_humidity,
+        "elevation": elevation
+    }
+
+
+def to_assessments(scores):
+    """
+    Convert score arrays into the API's per-location risk assessment dicts
+    (plain Python types, rounded with round() as the API always has)
+    """
+    assessments = []
+    for i in range(len(scores["total_risk_score"])):
+        assessments.append({
+            "risk_level": str(scores["risk_level"][i]),
+            "risk_percentage": round(float(scores["risk_percentage"][i]), 2),
+            "water_level": round(float(scores["water_level"][i]), 2),
+            "risk_factors": {factor: int(scores[factor][i]) for factor in FACTORS},
+            "total_risk_score": int(scores["total_risk_score"][i]),
+            "max_possible_risk": MAX_POSSIBLE_RISK,
+            "weather_data": {
+                "current_rainfall": round(float(scores["current_rainfall"][i]), 2),
+                "forecast_rainfall": round(float(scores["forecast_rainfall"][i]), 2),
+                "avg_rainfall": round(float(scores["avg_rainfall"][i]), 2),
+                "avg_humidity": round(float(scores["avg_humidity"][i]), 2),
+                "elevation": round(float(scores["elevation"][i]), 2)
+            }
+        })
+    return assessments
+
+
+def assess_forecasts(forecasts, elevations, drainage_risk=None):
+    """
+    Score a list of parsed forecasts with their elevations and return one
+    risk assessment dict per forecast
+    """
+    columns = forecast_columns(forecasts)
+    elevation = np.array([to_float(value) for value in elevations], dtype=np.float64)
+    return to_assessments(score_forecasts(elevation=elevation, drainage_risk=drainage_risk, **columns))
@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Rate budget for upstream calls: refills at ``rate_per_minute`` up to
+    ``capacity`` tokens (one minute's worth by default)
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self):
+        with self._lock:
+            self._refill()
+            return int(self.tokens)
+
+    def spend(self, count):
+        with self._lock:
+            self._refill()
+            self.tokens = max(0.0, self.tokens - count)
+
+
+class RefreshScheduler:
+    """
+    Periodically calls ``refresh(budget)`` on a daemon thread (or in the
+    foreground via run_forever, for a separate worker process).
+
+    ``refresh`` receives the number of upstream calls it may make this cycle
+    and returns how many it actually made, which is charged to the bucket.
+    """
+
+    def __init__(self, refresh, interval=300, rate_per_minute=30, name="refresh-scheduler"):
+        self.refresh = refresh
+        self.name = name
+        self.interval = interval
+        self.bucket = TokenBucket(rate_per_minute)
+        self.runs = 0
+        self.last_run_at = None
+        self.last_calls = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        budget = self.bucket.available()
+        calls = 0
+        if budget > 0:
+            try:
+                calls = self.refresh(budget) or 0
+            except Exception:
+                logger.exception("Error in scheduled %s run", self.name)
+        self.bucket.spend(calls)
+        self.runs += 1
+        self.last_run_at = time.time()
+        self.last_calls = calls
+        return calls
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'interval': self.interval,
+            'runs': self.runs,
+            'last_run_at': self.last_run_at,
+            'last_calls': self.last_calls,
+            'budget_available': self.bucket.available()
+        }
@@ -0,0 +1,128 @@
+"""
+Single-flight coalescing of identical upstream calls.
+
+While a call for a key is in flight, every other caller asking for the
+same key waits for it and shares its result (or its exception) instead of
+making its own request. Keys are ``(endpoint, ...)`` tuples, e.g. a
+forecast grid cell or a quantized elevation point. Request threads (sync)
+and the managed event loop (async) coalesce with each other.
+"""
+import asyncio
+import threading
+
+from app.utils import metrics
+
+
+class _Call:
+    __slots__ = ("done", "value", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiters = []  # (loop, future) of async followers
+
+
+def _resolve(future, value, error):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(value)
+
+
+class SingleFlight:
+    """
+    Per-key in-flight call registry with per-endpoint counters: ``calls``
+    made upstream and ``coalesced`` callers that shared one
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def _count(self, endpoint, field):
+        counts = self._counts.setdefault(endpoint, {"calls": 0, "coalesced": 0})
+        counts[field] += 1
+
+    def _join(self, key):
+        # Returns (call, leader); must be called with the lock held
+        call = self._calls.get(key)
+        if call is not None:
+            self._count(key[0], "coalesced")
+            return call, False
+        call = self._calls[key] = _Call()
+        self._count(key[0], "calls")
+        return call, True
+
+    def _finish(self, key, call, value, error):
+        with self._lock:
+            del self._calls[key]
+            call.value, call.error = value, error
+            call.done.set()
+            waiters, call.waiters = call.waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future, value, error)
+
+    def do(self, key, fetch):
+        """Return ``fetch()``, sharing the result with concurrent callers of ``key``"""
+        with self._lock:
+            call, leader = self._join(key)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            value = fetch()
+        except BaseException as e:
+            self._finish(key, call, None, e)
+            raise
+        self._finish(key, call, value, None)
+        return value
+
+    async def do_async(self, key, fetch_async):
+        """Async variant of do: awaits ``fetch_async()`` or the call already in flight"""
+        with self._lock:
+            call, leader = self._join(key)
+            if not leader and not call.done.is_set():
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                call.waiters.append((loop, future))
+        if not leader:
+            if call.done.is_set():
+                if call.error is not None:
+                    raise call.error
+                return call.value
+            return await asyncio.shield(future)
+        try:
+            value = await fetch_async()
+        except BaseException as e:
+            self._finish(key, call, None, e)
+            raise
+        self._finish(key, call, value, None)
+        return value
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        """{endpoint: {"calls", "coalesced"}} since startup"""
+        with self._lock:
+            return {endpoint: dict(counts) for endpoint, counts in self._counts.items()}
+
+    def collect(self):
+        calls = metrics.MetricFamily("singleflight_calls_total", "counter", "Upstream calls made by single-flight leaders")
+        coalesced = metrics.MetricFamily("singleflight_coalesced_total", "counter", "Callers that shared an in-flight call")
+        for endpoint, counts in sorted(self.stats().items()):
+            calls.add(counts["calls"], endpoint=endpoint)
+            coalesced.add(counts["coalesced"], endpoint=endpoint)
+        in_flight = metrics.MetricFamily("singleflight_in_flight", "gauge", "Calls currently in flight").add(self.in_flight())
+        return [calls, coalesced, in_flight]
+
+
+flights = SingleFlight()
+metrics.register("singleflight", flights.collect)
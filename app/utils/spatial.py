@@ -0,0 +1,121 @@
+"""
+Spatial query strategies for saved locations.
+
+``GeohashIndex`` works on any backend (and is the only one for SQLite): box
+queries become prefix range scans over the B-tree indexed Location.geohash
+column. ``PostGISIndex`` adds a generated geometry column with a GiST index
+to PostgreSQL and lets the database answer box and radius tests itself.
+Callers still apply the exact in_bbox/haversine checks, so both strategies
+return the same rows.
+"""
+import logging
+
+from sqlalchemy import and_, func, literal_column, or_
+
+from app.models import db, Location
+from app.utils.geo import PREFIX_UPPER_BOUND, bbox_around, covering_cells
+
+logger = logging.getLogger(__name__)
+
+SPATIAL_INDEXES = ("auto", "geohash", "postgis")
+
+
+class GeohashIndex:
+    name = "geohash"
+
+    def bbox_filter(self, query, min_lat, min_lng, max_lat, max_lng):
+        """
+        Narrow ``query`` to geohash prefix range scans covering the box; the
+        candidates still need an exact in_bbox check
+        """
+        cells = covering_cells(min_lat, min_lng, max_lat, max_lng)
+        if cells != [""]:
+            query = query.filter(or_(*[
+                and_(Location.geohash >= cell, Location.geohash < cell + PREFIX_UPPER_BOUND) for cell in cells
+            ]))
+        return query
+
+    def radius_filter(self, query, lat, lng, radius_km):
+        return self.bbox_filter(query, *bbox_around(lat, lng, radius_km))
+
+
+class PostGISIndex:
+    name = "postgis"
+    geom = literal_column("locations.geom")
+
+    def prepare(self):
+        """
+        Add the generated point column and its GiST indexes (idempotent).
+        The geography expression index serves ST_DWithin radius queries.
+        """
+        for statement in (
+            "CREATE EXTENSION IF NOT EXISTS postgis",
+            "ALTER TABLE locations ADD COLUMN IF NOT EXISTS geom geometry(Point, 4326) "
+            "GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)) STORED",
+            "CREATE INDEX IF NOT EXISTS ix_locations_geom ON locations USING GIST (geom)",
+            "CREATE INDEX IF NOT EXISTS ix_locations_geog ON locations USING GIST ((geom::geography))"
+        ):
+            db.session.execute(db.text(statement))
+        db.session.commit()
+
+    def _envelope(self, min_lat, min_lng, max_lat, max_lng):
+        bounds = (float(min_lng), float(min_lat), float(max_lng), float(max_lat))
+        return self.geom.op("&&")(func.ST_MakeEnvelope(*bounds, 4326))
+
+    def bbox_filter(self, query, min_lat, min_lng, max_lat, max_lng):
+        if min_lng > max_lng:
+            # Crosses the antimeridian: one envelope on each side
+            return query.filter(or_(
+                self._envelope(min_lat, min_lng, max_lat, 180.0),
+                self._envelope(min_lat, -180.0, max_lat, max_lng)
+            ))
+        return query.filter(self._envelope(min_lat, min_lng, max_lat, max_lng))
+
+    def radius_filter(self, query, lat, lng, radius_km):
+        # Sphere (not spheroid) distance so results agree with haversine_km
+        point = func.ST_SetSRID(func.ST_MakePoint(float(lng), float(lat)), 4326)
+        return query.filter(func.ST_DWithin(
+            literal_column("locations.geom::geography"), func.Geography(point), float(radius_km) * 1000, False
+        ))
+
+
+index = GeohashIndex()
+
+
+def _prepare_postgis(required):
+    strategy = PostGISIndex()
+    try:
+        strategy.prepare()
+    except Exception as e:
+        db.session.rollback()
+        if required:
+            raise
+        logger.warning("PostGIS unavailable, using the geohash index: %s", e)
+        return None
+    return strategy
+
+
+def init_app(app):
+    """
+    Choose the spatial strategy from SPATIAL_INDEX: "postgis", "geohash" or
+    "auto" (PostGIS when the database is PostgreSQL and the extension can be
+    enabled). Must run after the tables exist.
+    """
+    global index
+    choice = app.config.get("SPATIAL_INDEX", "auto")
+    if choice not in SPATIAL_INDEXES:
+        raise ValueError(f"SPATIAL_INDEX must be one of {', '.join(SPATIAL_INDEXES)}")
+    strategy = None
+    with app.app_context():
+        if choice == "postgis" or (choice == "auto" and db.engine.dialect.name == "postgresql"):
+            strategy = _prepare_postgis(required=choice == "postgis")
+    index = strategy or GeohashIndex()
+    logger.info("Using %s spatial index", index.name)
+
+
+def bbox_filter(query, min_lat, min_lng, max_lat, max_lng):
+    return index.bbox_filter(query, min_lat, min_lng, max_lat, max_lng)
+
+
+def radius_filter(query, lat, lng, radius_km):
+    return index.radius_filter(query, lat, lng, radius_km)
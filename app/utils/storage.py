@@ -0,0 +1,66 @@
+"""
+Connection-level tuning for the SQLAlchemy engine.
+
+Server databases (PostgreSQL) get a sized connection pool with pre-ping and
+recycling from the DB_POOL_* settings.
+
+SQLite defaults (rollback journal, synchronous=FULL, no busy timeout) make
+every commit an fsync and let one writer block all readers. For SQLite
+databases the pragmas below are applied to each new pooled connection:
+WAL lets readers proceed alongside a writer, synchronous=NORMAL only syncs
+at checkpoints, and busy_timeout makes competing writers wait instead of
+failing with "database is locked".
+"""
+from sqlalchemy import event
+
+
+def sqlite_pragmas(config):
+    """Return the (pragma, value) pairs to apply, skipping unset settings"""
+    pragmas = [
+        ("journal_mode", config.get("SQLITE_JOURNAL_MODE")),
+        ("synchronous", config.get("SQLITE_SYNCHRONOUS")),
+        ("busy_timeout", config.get("SQLITE_BUSY_TIMEOUT")),
+        ("mmap_size", config.get("SQLITE_MMAP_SIZE")),
+        ("cache_size", config.get("SQLITE_CACHE_SIZE"))
+    ]
+    return [(name, value) for name, value in pragmas if value is not None and value != ""]
+
+
+def engine_options(config):
+    """
+    SQLAlchemy engine options for the configured database: pooled
+    connections for server databases, driver defaults for SQLite
+    """
+    if config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"]
+    }
+
+
+def init_app(app, db):
+    """
+    Register connect-time pragmas on the app's engine (SQLite only; other
+    backends are left alone)
+    """
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = sqlite_pragmas(app.config)
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    # Connections opened before the listener existed would miss the pragmas
+    engine.dispose()
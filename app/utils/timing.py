@@ -0,0 +1,201 @@
+"""
+Per-request phase timings and an opt-in profiler for slow requests.
+
+Handlers mark phases with ``with phase("score"):`` (or ``await
+timed("weather", coro)`` for coroutines on the upstream loop, which run in
+a copy of the request's context); SQL statement time is added as ``sql``
+automatically. The totals are returned in a Server-Timing header, e.g.
+``weather;dur=48.2, elevation;dur=3.1, score;dur=1.4, sql;dur=2.0;desc="3
+queries", total;dur=55.0``. Phases may overlap (weather and elevation run
+concurrently, commit includes its SQL).
+
+With PROFILE_ENABLED, a PROFILE_SAMPLE_RATE share of requests (plus any
+request sent with ``X-Profile: 1``, which needs the admin token when
+ADMIN_TOKEN is set) run under cProfile, and the profile is written to
+PROFILE_DIR when the request took at least PROFILE_SLOW_MS (forced ones
+always). Open the .prof files with snakeviz, flameprof or
+``python -m pstats``. cProfile only sees the request thread: time spent
+on the upstream loop shows up as waiting in async_upstream.run.
+"""
+import contextvars
+import cProfile
+import logging
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# {phase: [seconds, count]} for the current request (None outside requests)
+_phases = contextvars.ContextVar("timing_phases", default=None)
+
+# Applied from the Flask config by init_app
+server_timing_enabled = True
+profile_enabled = False
+profile_dir = None
+profile_sample_rate = 0.01
+profile_slow_ms = 500
+profile_max_files = 200
+admin_token = None
+
+
+def add(name, seconds):
+    """Add ``seconds`` to phase ``name`` of the current request, if any"""
+    phases = _phases.get()
+    if phases is not None:
+        totals = phases.setdefault(name, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+
+
+@contextmanager
+def phase(name):
+    """Time the enclosed block as phase ``name`` of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - started)
+
+
+async def timed(name, awaitable):
+    """Await ``awaitable``, timing it as phase ``name`` of the current request"""
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        add(name, time.perf_counter() - started)
+
+
+def server_timing(phases, total):
+    """Format phase totals (seconds) as a Server-Timing header value"""
+    entries = []
+    for name, (seconds, count) in phases.items():
+        entry = f"{name};dur={seconds * 1000:.1f}"
+        if name == "sql":
+            entry += f';desc="{count} queries"'
+        entries.append(entry)
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def _profile_requested():
+    if not profile_enabled:
+        return False
+    if request.headers.get("X-Profile") == "1":
+        if not admin_token or request.headers.get("Authorization") == f"Bearer {admin_token}":
+            g.profile_forced = True
+            return True
+    return random.random() < profile_sample_rate
+
+
+def _begin_request():
+    g.timing_started = time.perf_counter()
+    g.timing_token = _phases.set({})
+    if _profile_requested():
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return  # another profiler is active (Python 3.12+ allows only one)
+        g.profiler = profiler
+
+
+def _finish_request(response):
+    started = g.get("timing_started")
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        if g.get("profile_forced") or elapsed * 1000 >= profile_slow_ms:
+            path = _dump(profiler, elapsed)
+            if path and g.get("profile_forced"):
+                response.headers["X-Profile-File"] = os.path.basename(path)
+    if server_timing_enabled:
+        response.headers["Server-Timing"] = server_timing(_phases.get() or {}, elapsed)
+    return response
+
+
+def _end_request(exc=None):
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()  # the response never reached after_request
+    token = g.pop("timing_token", None)
+    if token is not None:
+        _phases.reset(token)
+
+
+def _dump(profiler, elapsed):
+    directory = profile_dir
+    route = request.url_rule.rule if request.url_rule is not None else request.path
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", route).strip("-") or "root"
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{slug}-{elapsed * 1000:.0f}ms-{os.getpid()}-{random.getrandbits(32):08x}.prof"
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name)
+        profiler.dump_stats(path)
+        _prune(directory)
+    except OSError as e:
+        logger.warning("Could not write profile %s: %s", name, e)
+        return None
+    logger.info("Profiled slow request %s %s (%.0f ms) to %s", request.method, request.path, elapsed * 1000, path)
+    return path
+
+
+def _prune(directory):
+    # Keep only the newest profile_max_files dumps
+    files = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith(".prof")),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in files[:max(0, len(files) - profile_max_files)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def instrument_engine(engine):
+    """Add the time of every statement executed on ``engine`` to the ``sql`` phase"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("timing_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        add("sql", time.perf_counter() - conn.info["timing_started"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("timing_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+def init_app(app, db):
+    """
+    Apply SERVER_TIMING and PROFILE_* settings (profiles default to
+    instance/profiles) and time every request of ``app``
+    """
+    global server_timing_enabled, profile_enabled, profile_dir, profile_sample_rate, profile_slow_ms
+    global profile_max_files, admin_token
+    server_timing_enabled = app.config.get("SERVER_TIMING", server_timing_enabled)
+    profile_enabled = app.config.get("PROFILE_ENABLED", profile_enabled)
+    profile_dir = app.config.get("PROFILE_DIR") or os.path.join(app.instance_path, "profiles")
+    profile_sample_rate = app.config.get("PROFILE_SAMPLE_RATE", profile_sample_rate)
+    profile_slow_ms = app.config.get("PROFILE_SLOW_MS", profile_slow_ms)
+    profile_max_files = app.config.get("PROFILE_MAX_FILES", profile_max_files)
+    admin_token = app.config.get("ADMIN_TOKEN")
+    app.before_request(_begin_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
+    with app.app_context():
+        instrument_engine(db.engine)
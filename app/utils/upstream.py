@@ -0,0 +1,275 @@
+"""
+Shared HTTP client for upstream APIs (WeatherAPI, open-meteo, Overpass, ...).
+
+One keep-alive session and connection pool per host, connect/read timeouts
+on every call, retries with jittered exponential backoff on 429/5xx and
+connection errors, a circuit breaker per host, and per-host latency/error
+counters.
+"""
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.utils import metrics
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+RETRY_METHODS = frozenset({"GET", "HEAD"})
+MAX_BACKOFF = 10.0  # seconds
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while a host's circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls fail fast for ``reset_timeout`` seconds. The first call after that
+    is let through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Half-open: let this call probe, keep failing fast meanwhile
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class HostMetrics:
+    """Request, error, retry and latency counters for one upstream host"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.short_circuited = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency = metrics.Histogram()
+        self._lock = threading.Lock()
+
+    def observe(self, latency, error=False):
+        self.latency.observe(latency)
+        with self._lock:
+            self.requests += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            if error:
+                self.errors += 1
+
+    def count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'retries': self.retries,
+                'short_circuited': self.short_circuited,
+                'latency_avg_ms': round(self.latency_total / self.requests * 1000, 2) if self.requests else 0.0,
+                'latency_max_ms': round(self.latency_max * 1000, 2)
+            }
+
+
+class UpstreamClient:
+    def __init__(self, connect_timeout=3.05, read_timeout=10, retries=2, backoff=0.5,
+                 pool_size=20, failure_threshold=5, reset_timeout=30):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._sessions = {}
+        self._breakers = {}
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def configure(self, **settings):
+        for name, value in settings.items():
+            if value is not None:
+                setattr(self, name, value)
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._breakers.clear()
+
+    def guards(self, host):
+        """
+        Return the (CircuitBreaker, HostMetrics) pair for ``host``. Shared
+        with the async client so both paths see the same circuit and counters.
+        """
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            metrics = self._metrics.setdefault(host, HostMetrics())
+            return self._breakers[host], metrics
+
+    def _session(self, host):
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[host] = session
+            return session
+
+    def retry_delay(self, attempt, retry_after=None):
+        """Jittered exponential backoff, stretched to honour Retry-After"""
+        delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return min(delay, MAX_BACKOFF)
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request through the host's pooled session. Returns the final
+        response (which may still be an error status once retries run out);
+        raises requests exceptions for transport failures and
+        CircuitOpenError while the host's circuit is open.
+        """
+        host = urlsplit(url).netloc
+        breaker, metrics = self.guards(host)
+        session = self._session(host)
+        if not breaker.allow():
+            metrics.count('short_circuited')
+            raise CircuitOpenError(f"Circuit open for {host}")
+
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+        attempts = self.retries + 1 if method.upper() in RETRY_METHODS else 1
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            started = time.perf_counter()
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                metrics.observe(time.perf_counter() - started, error=True)
+                if last_attempt:
+                    breaker.record_failure()
+                    raise
+                metrics.count('retries')
+                time.sleep(self.retry_delay(attempt))
+                continue
+
+            failed = response.status_code in RETRY_STATUSES
+            metrics.observe(time.perf_counter() - started, error=failed)
+            if failed and not last_attempt:
+                metrics.count('retries')
+                time.sleep(self.retry_delay(attempt, response.headers.get("Retry-After")))
+                continue
+            if failed:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            hosts = dict(self._metrics)
+            breakers = dict(self._breakers)
+        return {
+            host: dict(metrics.to_dict(), circuit=breakers[host].state if host in breakers else "closed")
+            for host, metrics in hosts.items()
+        }
+
+    def collect(self):
+        """Per-host Prometheus metrics (see app.utils.metrics)"""
+        with self._lock:
+            hosts = dict(self._metrics)
+            breakers = dict(self._breakers)
+        latency = metrics.MetricFamily("upstream_request_duration_seconds", "histogram", "Upstream attempt latency by host")
+        families = {
+            field: metrics.MetricFamily(f"upstream_{field}_total", "counter", description)
+            for field, description in (
+                ("requests", "Upstream attempts by host"),
+                ("errors", "Upstream attempts that failed (transport error or retryable status)"),
+                ("retries", "Upstream attempts that were retried"),
+                ("short_circuited", "Upstream calls refused by an open circuit")
+            )
+        }
+        circuit = metrics.MetricFamily("upstream_circuit_open", "gauge", "1 while the host's circuit breaker is open")
+        for host, host_metrics in sorted(hosts.items()):
+            latency.add_histogram(host_metrics.latency, host=host)
+            counts = host_metrics.to_dict()
+            for field, family in families.items():
+                family.add(counts[field], host=host)
+            circuit.add(int(host in breakers and breakers[host].state == "open"), host=host)
+        return [latency, *families.values(), circuit]
+
+
+client = UpstreamClient()
+
+
+def init_app(app):
+    """
+    Apply timeout, retry, pool and circuit breaker settings from the Flask config
+    """
+    client.configure(
+        connect_timeout=app.config.get('UPSTREAM_CONNECT_TIMEOUT'),
+        read_timeout=app.config.get('UPSTREAM_READ_TIMEOUT'),
+        retries=app.config.get('UPSTREAM_RETRIES'),
+        backoff=app.config.get('UPSTREAM_BACKOFF'),
+        pool_size=app.config.get('UPSTREAM_POOL_SIZE'),
+        failure_threshold=app.config.get('UPSTREAM_FAILURE_THRESHOLD'),
+        reset_timeout=app.config.get('UPSTREAM_RESET_TIMEOUT')
+    )
+    metrics.register("upstream", client.collect)
+
+
+def get(url, **kwargs):
+    return client.get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    return client.post(url, **kwargs)
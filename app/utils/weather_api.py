@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import os
+import httpx
+import requests
+from app.utils import upstream, async_upstream, metrics
+from app.utils.cache import MISS, TTLCache, snap_coordinates
+from app.utils.forecast import parse_forecast
+from app.utils.quota import BACKGROUND, INTERACTIVE, QuotaExceeded, QuotaManager
+from app.utils.singleflight import flights
+
+logger = logging.getLogger(__name__)
+
+WEATHER_API_URL = "https://api.weatherapi.com/v1"
+FORECAST_DAYS = 5
+
+# Coordinates are snapped to this grid (degrees) before hitting the cache
+# and the upstream, so nearby markers share one forecast
+forecast_grid = 0.01
+api_url = WEATHER_API_URL
+forecast_cache = TTLCache(ttl=600, stale_ttl=1800, max_entries=2048)
+# Persistent call budget (see app.utils.quota); opened by init_app
+quota = QuotaManager("weatherapi")
+# Once the budget is low, interactive misses prefer a cached forecast up to this old (seconds)
+fallback_max_age = 6 * 3600
+
+
+class WeatherAPIError(Exception):
+    """Raised when WeatherAPI.com answers with a non-2xx status"""
+
+    def __init__(self, status_code, message=""):
+        super().__init__(f"WeatherAPI error {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+class QuotaExceededError(WeatherAPIError):
+    """Raised when the call budget is spent and no cached forecast can stand in"""
+
+    def __init__(self, message=""):
+        super().__init__(429, message)
+
+
+def init_app(app):
+    """
+    Apply the API URL and cache settings from the Flask config and open the
+    persistent quota counters (defaults to the app instance folder)
+    """
+    global forecast_grid, api_url, fallback_max_age
+    forecast_grid = app.config.get('WEATHER_CACHE_GRID', forecast_grid)
+    api_url = app.config.get('WEATHER_API_URL') or WEATHER_API_URL
+    forecast_cache.configure(
+        ttl=app.config.get('WEATHER_CACHE_TTL'),
+        stale_ttl=app.config.get('WEATHER_CACHE_STALE_TTL'),
+        max_entries=app.config.get('WEATHER_CACHE_MAX_ENTRIES')
+    )
+    fallback_max_age = app.config.get('WEATHER_QUOTA_FALLBACK_MAX_AGE', fallback_max_age)
+    quota.configure(
+        daily_limit=app.config.get('WEATHER_QUOTA_DAILY'),
+        monthly_limit=app.config.get('WEATHER_QUOTA_MONTHLY'),
+        reserve=app.config.get('WEATHER_QUOTA_RESERVE'),
+        burst=app.config.get('WEATHER_QUOTA_BURST')
+    )
+    path = app.config.get('WEATHER_QUOTA_PATH')
+    if not path:
+        os.makedirs(app.instance_path, exist_ok=True)
+        path = os.path.join(app.instance_path, 'upstream_usage.db')
+    quota.open(path)
+    metrics.register_cache("forecast", forecast_cache.stats)
+    metrics.register("weather_quota", quota.collect)
+
+
+def fetch_forecast(lat, lng, api_key, days=FORECAST_DAYS):
+    """
+    Fetch a forecast (which includes current conditions) from WeatherAPI.com
+    and parse it into a compact Forecast
+    """
+    try:
+        response = upstream.get(
+            f"{api_url}/forecast.json",
+            params={
+                "key": api_key,
+                "q": f"{lat},{lng}",
+                "days": days,
+                "aqi": "no",
+                "alerts": "no"
+            }
+        )
+    except requests.exceptions.RequestException as e:
+        raise WeatherAPIError(503, str(e))
+    if not response.ok:
+        raise WeatherAPIError(response.status_code, response.text)
+    return parse_forecast(response.json())
+
+
+async def fetch_forecast_async(lat, lng, api_key, days=FORECAST_DAYS):
+    """
+    Async counterpart of fetch_forecast, for use on the managed event loop
+    """
+    try:
+        response = await async_upstream.get(
+            f"{api_url}/forecast.json",
+            params={
+                "key": api_key,
+                "q": f"{lat},{lng}",
+                "days": days,
+                "aqi": "no",
+                "alerts": "no"
+            }
+        )
+    except (httpx.HTTPError, requests.exceptions.RequestException) as e:
+        raise WeatherAPIError(503, str(e))
+    if not response.is_success:
+        raise WeatherAPIError(response.status_code, response.text)
+    return parse_forecast(response.json())
+
+
+def forecast_key(lat, lng):
+    """Return the grid cell (snapped lat, lng) a forecast is cached under"""
+    return snap_coordinates(lat, lng, forecast_grid)
+
+
+def _spend(priority):
+    try:
+        quota.acquire(priority)
+    except QuotaExceeded as e:
+        raise QuotaExceededError(str(e))
+
+
+def _fetch_cell(key, api_key, priority=INTERACTIVE):
+    # One upstream call per grid cell and priority at a time; concurrent
+    # misses share it. A background refusal must not fail interactive callers.
+    def fetch():
+        _spend(priority)
+        forecast = fetch_forecast(key[0], key[1], api_key)
+        forecast_cache.set(key, forecast)
+        return forecast
+    return flights.do(("forecast",) + key + (priority,), fetch)
+
+
+async def _fetch_cell_async(key, api_key, priority=INTERACTIVE):
+    async def fetch():
+        await asyncio.to_thread(_spend, priority)
+        forecast = await fetch_forecast_async(key[0], key[1], api_key)
+        forecast_cache.set(key, forecast)
+        return forecast
+    return await flights.do_async(("forecast",) + key + (priority,), fetch)
+
+
+def _cached_fallback(key, max_age=None):
+    forecast = forecast_cache.peek(key, max_age)
+    if forecast is not MISS:
+        quota.fallbacks += 1
+        logger.info("WeatherAPI budget low, serving an expired forecast for %s", key)
+    return forecast
+
+
+def _lookup(key, api_key, priority):
+    # Cached (or, while the budget is low, expired) forecast for the cell,
+    # or MISS. Stale-while-revalidate refreshes always spend background budget.
+    forecast = forecast_cache.lookup(key, lambda: _fetch_cell(key, api_key, BACKGROUND))
+    if forecast is MISS and priority == INTERACTIVE and quota.low():
+        forecast = _cached_fallback(key, fallback_max_age)
+    return forecast
+
+
+def get_forecast(lat, lng, api_key, priority=INTERACTIVE):
+    """
+    Return the forecast for the grid cell containing (lat, lng), served from
+    the shared cache when possible; concurrent misses for the same cell share
+    one upstream call. The returned Forecast is shared between callers; its
+    arrays are read-only.
+
+    Upstream calls are charged to the ``priority`` budget (INTERACTIVE for
+    request handlers, BACKGROUND for scheduled refreshes). When the budget
+    is low or spent an expired cached forecast is served instead; with
+    nothing cached QuotaExceededError (429) is raised.
+    """
+    key = forecast_key(lat, lng)
+    forecast = _lookup(key, api_key, priority)
+    if forecast is not MISS:
+        return forecast
+    try:
+        return _fetch_cell(key, api_key, priority)
+    except QuotaExceededError:
+        forecast = _cached_fallback(key)
+        if forecast is MISS:
+            raise
+        return forecast
+
+
+async def get_forecast_async(lat, lng, api_key, priority=INTERACTIVE):
+    """
+    Async counterpart of get_forecast sharing the same cache, budget and
+    in-flight calls; quota reads and writes (SQLite, possibly waiting on
+    another process) run in worker threads so they never block the loop
+    """
+    key = forecast_key(lat, lng)
+    forecast = forecast_cache.lookup(key, lambda: _fetch_cell(key, api_key, BACKGROUND))
+    if forecast is MISS and priority == INTERACTIVE and await asyncio.to_thread(quota.low):
+        forecast = _cached_fallback(key, fallback_max_age)
+    if forecast is not MISS:
+        return forecast
+    try:
+        return await _fetch_cell_async(key, api_key, priority)
+    except QuotaExceededError:
+        forecast = _cached_fallback(key)
+        if forecast is MISS:
+            raise
+        return forecast
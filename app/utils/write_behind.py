@@ -0,0 +1,114 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    Buffers records submitted by request handlers and hands them to
+    ``flush(records)`` in batches from a daemon thread, so many requests
+    share one transaction (one fsync) instead of committing individually.
+
+    A batch is flushed once ``max_batch`` records are waiting or ``interval``
+    seconds after its first record arrived. ``submit`` blocks when
+    ``max_pending`` records are already queued. Pending records are flushed
+    at interpreter exit unless ``drain_at_exit`` is off.
+    """
+
+    def __init__(self, flush, interval=0.5, max_batch=500, max_pending=10000, name="write-behind",
+                 drain_at_exit=True):
+        self.flush = flush
+        self.interval = interval
+        self.max_batch = max_batch
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+        if drain_at_exit:
+            atexit.register(self.drain)
+
+    def submit(self, record):
+        self._start()
+        self._queue.put(record)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _take_batch(self, block=True):
+        try:
+            batch = [self._queue.get(timeout=1.0) if block else self._queue.get_nowait()]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic() if block else 0
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                if remaining <= 0:
+                    break
+        return batch
+
+    def _write(self, batch):
+        try:
+            self.flush(batch)
+            self.written += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("%s flush of %d records failed", self.name, len(batch))
+        finally:
+            self.batches += 1
+            for _ in batch:
+                self._queue.task_done()
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+
+    def drain(self):
+        """Flush everything queued so far on the calling thread"""
+        while True:
+            batch = self._take_batch(block=False)
+            if not batch:
+                return
+            self._write(batch)
+
+    def stats(self):
+        return {
+            'pending': self._queue.qsize(),
+            'batches': self.batches,
+            'written': self.written,
+            'failed': self.failed
+        }
+
+    def collect(self):
+        return collect([self])
+
+
+def collect(queues):
+    """Metric families for several queues, one sample per queue"""
+    pending = metrics.MetricFamily("write_behind_pending", "gauge", "Records waiting to be flushed")
+    written = metrics.MetricFamily("write_behind_written_total", "counter", "Records flushed")
+    failed = metrics.MetricFamily("write_behind_failed_total", "counter", "Records dropped by failed flushes")
+    batches = metrics.MetricFamily("write_behind_batches_total", "counter", "Batches flushed")
+    for write_queue in queues:
+        stats = write_queue.stats()
+        pending.add(stats["pending"], queue=write_queue.name)
+        written.add(stats["written"], queue=write_queue.name)
+        failed.add(stats["failed"], queue=write_queue.name)
+        batches.add(stats["batches"], queue=write_queue.name)
+    return [pending, written, failed, batches]
@@ -0,0 +1,326 @@
+"""
+Benchmark the API hot paths against a stubbed upstream.
+
+Boots a fake WeatherAPI / open-meteo / Overpass / SRTM tile server with a
+configurable latency and the app (on a throwaway database seeded with N
+locations) in separate processes, then drives each endpoint at each
+concurrency level and reports p50/p95/p99 latency, throughput and upstream
+calls as JSON that can be diffed between commits:
+
+    python benchmark.py --locations 500 --concurrency 1,8,32 --output before.json
+"""
+import argparse
+import gzip
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import requests
+
+ENDPOINTS = ("locations", "predict", "weather", "share")
+# Seeded locations are spread over this box (roughly Metro Manila)
+SEED_BOUNDS = (14.40, 120.90, 14.80, 121.10)
+
+
+def fake_forecast(lat, lng, days):
+    """Deterministic WeatherAPI forecast.json payload (with hourly detail) for a point"""
+    base = abs(hash((round(lat, 2), round(lng, 2)))) % 40
+
+    def hour(day, h):
+        return {
+            "time_epoch": 1760000000 + day * 86400 + h * 3600, "temp_c": 25.0 + h % 5, "humidity": 70 + h % 20,
+            "precip_mm": (base + h) % 7 / 10, "wind_kph": 8.0 + h % 6, "chance_of_rain": 60,
+            "condition": {"text": "Patchy rain possible", "icon": "//cdn.weatherapi.com/weather/64x64/day/176.png"}
+        }
+
+    return {
+        "location": {"name": "Benchmark", "lat": lat, "lon": lng, "tz_id": "UTC"},
+        "current": {
+            "temp_c": 26.0, "humidity": 80, "wind_kph": 9.0, "precip_mm": base / 10,
+            "condition": {"text": "Light rain", "icon": "//cdn.weatherapi.com/weather/64x64/day/296.png"}
+        },
+        "forecast": {"forecastday": [
+            {
+                "date": f"2026-01-{day + 1:02d}",
+                "day": {
+                    "avgtemp_c": 26.5, "maxwind_kph": 14.0, "totalprecip_mm": base + day * 5.0,
+                    "avghumidity": 75 + day, "daily_chance_of_rain": 80,
+                    "condition": {"text": "Moderate rain", "icon": "//cdn.weatherapi.com/weather/64x64/day/302.png"}
+                },
+                "hour": [hour(day, h) for h in range(24)]
+            }
+            for day in range(days)
+        ]}
+    }
+
+
+def fake_dem_tile(size=121):
+    """Gzipped HGT tile (big-endian int16 grid) with a gentle deterministic slope"""
+    rows, cols = np.mgrid[0:size, 0:size]
+    return gzip.compress(((rows + cols) % 40).astype(">i2").tobytes())
+
+
+def run_fake_upstream(latency, ready):
+    """Serve the fake upstream APIs until the process is terminated"""
+    calls = {}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if url.path == "/_stats":
+                with lock:
+                    return self._send(dict(calls))
+            with lock:
+                calls[url.path] = calls.get(url.path, 0) + 1
+            time.sleep(latency)
+            if url.path.endswith("/forecast.json"):
+                lat, lng = (float(part) for part in query["q"].split(","))
+                return self._send(fake_forecast(lat, lng, int(query.get("days", 5))))
+            if url.path.endswith("/elevation"):
+                return self._send({"elevation": [3.0 + i % 30 for i, _ in enumerate(query["latitude"].split(","))]})
+            if url.path.endswith("/interpreter"):
+                return self._send({"elements": []})
+            if url.path.endswith(".hgt.gz"):
+                return self._send_bytes(fake_dem_tile())
+            self._send({"error": "not found"}, 404)
+
+        def _send(self, payload, status=200):
+            self._send_bytes(json.dumps(payload).encode(), status, "application/json")
+
+        def _send_bytes(self, body, status=200, content_type="application/octet-stream"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    ready.put(server.server_port)
+    server.serve_forever()
+
+
+def run_app(upstream_url, workdir, locations, seed, quiet, ready):
+    """Seed a throwaway database and serve the app until the process is terminated"""
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    os.environ["WEATHER_API_KEY"] = "benchmark"
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from config import Config
+    from app import create_app
+    from app.models import db, Location
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(workdir, "benchmark.db")
+        WEATHER_API_URL = upstream_url + "/v1"
+        ELEVATION_API_URL = upstream_url + "/v1/elevation"
+        OVERPASS_URL = upstream_url + "/api/interpreter"
+        ELEVATION_CACHE_PATH = os.path.join(workdir, "elevation_cache.db")
+        OSM_CACHE_PATH = os.path.join(workdir, "osm_context.db")
+        WEATHER_QUOTA_PATH = os.path.join(workdir, "upstream_usage.db")
+        DEM_CACHE_DIR = os.path.join(workdir, "dem_tiles")
+        DEM_TILE_URL = upstream_url + "/skadi/{lat_band}/{name}.hgt.gz"
+        REFRESH_ENABLED = False
+        HISTORY_PRUNE_INTERVAL = 0
+
+    app = create_app(BenchmarkConfig, start_workers=False)
+    rng = random.Random(seed)
+    min_lat, min_lng, max_lat, max_lng = SEED_BOUNDS
+    with app.app_context():
+        db.session.add_all([
+            Location(
+                name=f"Benchmark {i}",
+                latitude=round(rng.uniform(min_lat, max_lat), 6),
+                longitude=round(rng.uniform(min_lng, max_lng), 6),
+                elevation=round(rng.uniform(1, 40), 1)
+            )
+            for i in range(locations)
+        ])
+        db.session.commit()
+        points = [(location.id, location.latitude, location.longitude) for location in Location.query.all()]
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler if quiet else None)
+    ready.put((server.server_port, points))
+    server.serve_forever()
+
+
+def make_request(session, base_url, endpoint, point):
+    location_id, lat, lng = point
+    if endpoint == "locations":
+        return session.get(f"{base_url}/api/locations")
+    if endpoint == "predict":
+        return session.post(
+            f"{base_url}/api/predict-flood-risk",
+            json={"location_id": location_id, "latitude": lat, "longitude": lng}
+        )
+    if endpoint == "weather":
+        return session.get(f"{base_url}/api/weather", params={"lat": lat, "lng": lng})
+    return session.get(f"{base_url}/api/share-location/{location_id}")
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {}
+    values = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3),
+        "mean": round(float(values.mean()), 3), "max": round(float(values.max()), 3)
+    }
+
+
+def run_level(base_url, endpoint, concurrency, total, points, seed):
+    """
+    Send ``total`` requests to one endpoint from ``concurrency`` workers
+    (each with its own keep-alive session); the sequence of locations is
+    fixed by ``seed``
+    """
+    rng = random.Random(seed)
+    sequence = [rng.choice(points) for _ in range(total)]
+    latencies = []
+    statuses = {}
+    position = iter(range(total))
+    lock = threading.Lock()
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                index = next(position, None)
+            if index is None:
+                return
+            started = time.perf_counter()
+            try:
+                status = make_request(session, base_url, endpoint, sequence[index]).status_code
+            except requests.exceptions.RequestException:
+                status = "error"
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - started
+    return {
+        "requests": total,
+        "errors": total - statuses.get("200", 0),
+        "statuses": statuses,
+        "rps": round(total / wall, 1),
+        "latency_ms": percentiles(latencies)
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def upstream_calls(upstream_url):
+    return requests.get(f"{upstream_url}/_stats").json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--locations", type=int, default=200, help="locations to seed")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset of " + ", ".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=400, help="requests per endpoint and level")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests per endpoint first")
+    parser.add_argument("--latency", type=float, default=50, help="fake upstream latency in milliseconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's debug output")
+    args = parser.parse_args()
+
+    endpoints = [endpoint for endpoint in args.endpoints.split(",") if endpoint]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    ready = multiprocessing.Queue()
+    processes = []
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as workdir:
+        try:
+            processes.append(multiprocessing.Process(target=run_fake_upstream, args=(args.latency / 1000, ready), daemon=True))
+            processes[-1].start()
+            upstream_url = f"http://127.0.0.1:{ready.get(timeout=30)}"
+            processes.append(multiprocessing.Process(
+                target=run_app, args=(upstream_url, workdir, args.locations, args.seed, not args.verbose, ready), daemon=True
+            ))
+            processes[-1].start()
+            app_port, points = ready.get(timeout=120)
+            base_url = f"http://127.0.0.1:{app_port}"
+
+            results = []
+            for endpoint in endpoints:
+                if args.warmup:
+                    run_level(base_url, endpoint, levels[0], args.warmup, points, args.seed + 1)
+                for concurrency in levels:
+                    before = upstream_calls(upstream_url)
+                    result = run_level(base_url, endpoint, concurrency, args.requests, points, args.seed)
+                    after = upstream_calls(upstream_url)
+                    result.update(endpoint=endpoint, concurrency=concurrency, upstream_calls={
+                        path: count - before.get(path, 0) for path, count in after.items() if count != before.get(path, 0)
+                    })
+                    results.append(result)
+                    print(
+                        f"{endpoint:>10} c={concurrency:<4} {result['rps']:>8} rps  "
+                        f"p50 {result['latency_ms']['p50']:>8} ms  p99 {result['latency_ms']['p99']:>8} ms  "
+                        f"errors {result['errors']}",
+                        file=sys.stderr
+                    )
+        finally:
+            for process in processes:
+                process.terminate()
+                process.join()
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "settings": {
+            "locations": args.locations, "requests": args.requests, "warmup": args.warmup,
+            "upstream_latency_ms": args.latency, "seed": args.seed, "concurrency": levels
+        },
+        "results": results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import queue
+import threading
+
+import pytest
+
+import benchmark
+from app import create_app
+from config import Config
+
+
+@pytest.fixture(scope="session")
+def make_app():
+    """Factory for an app whose database and side stores live in ``workdir``"""
+
+    def factory(workdir, **settings):
+        class TestConfig(Config):
+            SQLALCHEMY_DATABASE_URI = "sqlite:///" + str(workdir / "test.db")
+            ELEVATION_CACHE_PATH = str(workdir / "elevation_cache.db")
+            OSM_CACHE_PATH = str(workdir / "osm_context.db")
+            WEATHER_QUOTA_PATH = str(workdir / "upstream_usage.db")
+            DEM_CACHE_DIR = str(workdir / "dem_tiles")
+            PROFILE_DIR = str(workdir / "profiles")
+            REFRESH_ENABLED = False
+            RISK_WRITE_BEHIND = False
+            HISTORY_PRUNE_INTERVAL = 0
+            LOG_LEVEL = "WARNING"
+
+        for name, value in settings.items():
+            setattr(TestConfig, name, value)
+        return create_app(TestConfig, start_workers=False)
+
+    return factory
+
+
+@pytest.fixture(scope="session")
+def fake_upstream():
+    """Base URL of the benchmark's fake WeatherAPI / open-meteo / Overpass / SRTM server"""
+    ready = queue.Queue()
+    threading.Thread(target=benchmark.run_fake_upstream, args=(0, ready), daemon=True).start()
+    return f"http://127.0.0.1:{ready.get(timeout=10)}"
+
+
+@pytest.fixture
+def upstream_settings(fake_upstream, monkeypatch):
+    """Settings pointing every upstream API at the fake server"""
+    monkeypatch.setenv("WEATHER_API_KEY", "test")
+    return {
+        "WEATHER_API_URL": fake_upstream + "/v1",
+        "ELEVATION_API_URL": fake_upstream + "/v1/elevation",
+        "OVERPASS_URL": fake_upstream + "/api/interpreter",
+        "DEM_TILE_URL": fake_upstream + "/skadi/{lat_band}/{name}.hgt.gz"
+    }
@@ -0,0 +1,40 @@
+"""
+Locations saved without an elevation store NULL, and the first assessment
+that resolves one writes it back, so later requests skip the lookup.
+"""
+from app.models import db, Location
+
+
+def test_predict_saves_resolved_elevation(make_app, upstream_settings, tmp_path):
+    app = make_app(tmp_path, **upstream_settings)
+    client = app.test_client()
+
+    response = client.post("/api/locations", json={"name": "No elevation", "latitude": 14.55, "longitude": 121.02})
+    assert response.status_code == 201
+    location_id = response.get_json()["id"]
+    assert response.get_json()["elevation"] is None
+
+    response = client.post("/api/predict-flood-risk", json={
+        "location_id": location_id, "latitude": 14.55, "longitude": 121.02
+    })
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+    with app.app_context():
+        elevation = db.session.get(Location, location_id).elevation
+    assert elevation is not None
+    assert round(elevation, 2) == response.get_json()["weather_data"]["elevation"]
+
+
+def test_zero_elevation_is_kept(make_app, upstream_settings, tmp_path):
+    app = make_app(tmp_path, **upstream_settings)
+    client = app.test_client()
+
+    response = client.post("/api/locations", json={"name": "Sea level", "latitude": 14.55, "longitude": 121.02, "elevation": 0})
+    location_id = response.get_json()["id"]
+    response = client.post("/api/predict-flood-risk", json={
+        "location_id": location_id, "latitude": 14.55, "longitude": 121.02
+    })
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+    with app.app_context():
+        assert db.session.get(Location, location_id).elevation == 0.0
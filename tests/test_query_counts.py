@@ -0,0 +1,87 @@
+"""
+The location list and detail endpoints must run a fixed number of SQL
+statements however many locations (and how much history) are stored: the
+latest weather and risk come from the denormalized columns on locations,
+not from a query per location.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.models import db, Location, WeatherData, RiskAssessment
+
+OBSERVATIONS_PER_LOCATION = 3
+
+
+def seed(app, count):
+    """Make ``count`` locations (init_db seeds the first), each with some weather and risk history"""
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.add_all([
+            Location(name=f"Location {i}", latitude=14.4 + i * 0.001, longitude=121.0, elevation=5.0)
+            for i in range(count - Location.query.count())
+        ])
+        db.session.commit()
+        for location in Location.query.all():
+            for age in range(OBSERVATIONS_PER_LOCATION):
+                timestamp = now - timedelta(hours=age)
+                db.session.add(WeatherData(location_id=location.id, rainfall=age, humidity=80, timestamp=timestamp))
+                db.session.add(RiskAssessment(location_id=location.id, risk_level="low", timestamp=timestamp))
+        db.session.commit()
+        return Location.query.order_by(Location.id.desc()).first().id
+
+
+def count_queries(app, client, url):
+    """Number of SQL statements executed while serving GET ``url``"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    client.get(url)  # warm up: first-request setup is not part of the endpoint's cost
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return len(statements), response.get_json()
+
+
+def query_counts(make_app, workdir, count):
+    app = make_app(workdir)
+    location_id = seed(app, count)
+    client = app.test_client()
+    counts = {}
+    for name, url in [
+        ("list", "/api/locations"),
+        ("list_fields", "/api/locations?fields=id,name,lat,lng,rainfall_history"),
+        ("list_page", "/api/locations?limit=25"),
+        ("detail", f"/api/locations/{location_id}")
+    ]:
+        counts[name], body = count_queries(app, client, url)
+        if name == "list":
+            assert len(body) == count
+        if name == "detail":
+            assert body["weather_data"] is not None
+            assert body["risk_level"] == "low"
+    return counts
+
+
+@pytest.fixture(scope="module")
+def counts(make_app, tmp_path_factory):
+    return {count: query_counts(make_app, tmp_path_factory.mktemp(f"locations-{count}"), count) for count in (1, 50)}
+
+
+@pytest.mark.parametrize("endpoint", ["list", "list_fields", "list_page", "detail"])
+def test_query_count_is_independent_of_location_count(counts, endpoint):
+    assert counts[1][endpoint] == counts[50][endpoint]
+
+
+@pytest.mark.parametrize("endpoint", ["list", "list_fields", "list_page", "detail"])
+def test_query_count_is_small(counts, endpoint):
+    # table version + locations for the list; location joined with its latest weather for the detail
+    assert counts[50][endpoint] <= 2